@@ -1,39 +1,108 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
-from ui.components import stock_header_with_info, stock_chart, stock_news_list
-from data.load_data import main as refresh_database, connect_to_db
-import time
-import pytz
-
-# Cache the function that retrieves stock metadata
-# @st.cache_data(ttl=600)  # cache for 10 minutes
-def load_stock_metadata(selected_stock):
-    cursor = conn.cursor()
-    stock_metadata = pd.read_sql(
-        f"SELECT * FROM public.lu_stock WHERE ticker = '{selected_stock}';",
-        conn)
-    stock_metadata['first_trade_date'] = pd.to_datetime(stock_metadata['first_trade_date']).dt.date
-    return stock_metadata
-
-# Cache the function that retrieves stock data
-# @st.cache_data(ttl=600)  # cache for 10 minutes
-def load_stock_data(selected_stock):
-    cursor = conn.cursor()
-    stock_data = pd.read_sql(
-        f"SELECT * FROM public.stocks WHERE ticker = '{selected_stock}' order by date desc;",
-        conn)
-    stock_data['date'] = pd.to_datetime(stock_data['date'], utc=True).dt.date
-    return stock_data
-
-# Cache the function that retrieves stock news
-# @st.cache_data(ttl=600)  # cache for 10 minutes
-def load_stock_news(selected_stock):
-    cursor = conn.cursor()
-    stock_news = pd.read_sql(
-        f"SELECT * FROM public.stock_news WHERE ticker = '{selected_stock}' order by provider_publish_time desc;",
-        conn)
-    return stock_news
+from ui.components import stock_header_with_info, stock_chart, stock_news_list, refresh_progress, metrics_debug_panel, comparison_view
+from data.load_data import load_tickers
+from data.refresh_jobs import RefreshQueue, HIGH, LOW
+from data.db import connection
+from data.cache import VersionedCache
+from data import metrics
+from data.queries import CHART_COLUMNS, NEWS_PAGE_SIZE, fetch_stock_metadata, fetch_price_history, fetch_stock_stats, fetch_stock_news, news_cursor, fetch_forecast, fetch_close_matrix
+from models.features import fetch_features
+import os
+
+# shared by every session of this Streamlit server process
+@st.cache_resource
+def get_query_cache():
+    return VersionedCache(max_bytes=int(os.getenv('QUERY_CACHE_MB', 256)) * 1024 * 1024)
+
+# one background refresh worker per server process, shared by every session
+@st.cache_resource
+def get_refresh_queue():
+    return RefreshQueue()
+
+# cheap version stamp for a ticker's cached queries; it changes whenever an
+# ingestion rewrites the ticker's metadata, which happens on every refresh, or
+# links a newer article (news is written in bulk after the prices), or computes newer features or forecasts
+def load_data_version(selected_stock):
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT last_updated,
+                   (SELECT MAX(provider_publish_time) FROM public.stock_news_tickers WHERE ticker = %(ticker)s),
+                   (SELECT last_date FROM public.feature_state WHERE ticker = %(ticker)s),
+                   (SELECT MAX(created_at) FROM public.predictions WHERE ticker = %(ticker)s)
+            FROM public.lu_stock WHERE ticker = %(ticker)s;
+        """, {'ticker': selected_stock})
+        row = cursor.fetchone()
+    return row if row else None
+
+# version stamps of several tickers' prices in one query (lu_stock is rewritten on every refresh)
+def load_price_versions(tickers):
+    with connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT ticker, last_updated FROM public.lu_stock WHERE ticker = ANY(%s);", (list(tickers),))
+        return dict(cursor.fetchall())
+
+# daily closes of the given tickers from start_date as a (date x ticker) frame. each ticker's
+# whole close history is cached as its own column, so adding a ticker to the comparison (or
+# changing the time frame) only fetches the columns not cached yet, together in one query
+def load_close_matrix(tickers, start_date):
+    versions = load_price_versions(tickers)
+    columns = {ticker: query_cache.get(('closes', ticker), versions.get(ticker)) for ticker in tickers}
+    missing = [ticker for ticker, column in columns.items() if column is None]
+    metrics.inc('ui_cache_total', len(tickers) - len(missing), loader='closes', result='hit')
+    if missing:
+        metrics.inc('ui_cache_total', len(missing), loader='closes', result='miss')
+        with connection() as conn, metrics.timer('ui_query_seconds', loader='closes'):
+            fetched = fetch_close_matrix(conn, missing)
+        for ticker in missing:
+            columns[ticker] = fetched[ticker].dropna()
+            query_cache.put(('closes', ticker), versions.get(ticker), columns[ticker])
+    closes = pd.concat(columns, axis=1).sort_index()
+    return closes[closes.index >= start_date]
+
+# runs fetch(conn, *args) on a pooled connection, cached until the ticker's version changes
+def cached_query(key, version, fetch, *args):
+    loaded = []
+    def query():
+        loaded.append(True)
+        with connection() as conn, metrics.timer('ui_query_seconds', loader=key[0]):
+            return fetch(conn, *args)
+    with metrics.timer('ui_loader_seconds', loader=key[0]):
+        result = query_cache.get_or_load(key, version, query)
+    metrics.inc('ui_cache_total', loader=key[0], result='miss' if loaded else 'hit')
+    return result
+
+# retrieves stock metadata
+def load_stock_metadata(selected_stock, version):
+    return cached_query(('metadata', selected_stock), version, fetch_stock_metadata, selected_stock)
+
+# retrieves the chart columns of the stock data for the selected time frame and resolution
+def load_stock_data(selected_stock, version, start_date, resolution):
+    return cached_query(('stocks', selected_stock, start_date, resolution), version,
+                        fetch_price_history, selected_stock, start_date, CHART_COLUMNS, resolution)
+
+# retrieves the selected indicator columns from the features table
+def load_indicators(selected_stock, version, start_date, columns):
+    return cached_query(('features', selected_stock, start_date, columns), version,
+                        fetch_features, selected_stock, start_date, columns)
+
+# retrieves the newest precomputed forecast per horizon
+def load_forecast(selected_stock, version):
+    return cached_query(('forecast', selected_stock), version, fetch_forecast, selected_stock)
+
+# retrieves the precomputed summary statistics (52-week range, time frame start prices)
+def load_stock_stats(selected_stock, version):
+    return cached_query(('stats', selected_stock), version, fetch_stock_stats, selected_stock)
+
+# retrieves one page of stock news, after the given keyset cursor (None for the first page)
+def load_stock_news(selected_stock, version, after=None):
+    return cached_query(('news', selected_stock, after), version, fetch_stock_news, selected_stock, after)
+
+# retrieves the first `pages` pages of stock news; returns the articles and whether more may exist
+def load_news_pages(selected_stock, version, pages):
+    news_pages = [load_stock_news(selected_stock, version)]
+    while len(news_pages) < pages and len(news_pages[-1]) == NEWS_PAGE_SIZE:
+        news_pages.append(load_stock_news(selected_stock, version, news_cursor(news_pages[-1])))
+    return pd.concat(news_pages, ignore_index=True), len(news_pages[-1]) == NEWS_PAGE_SIZE
 
 # page configurations
 st.set_page_config(
@@ -51,13 +120,17 @@ hide_default_format = """
        """
 st.markdown(hide_default_format, unsafe_allow_html=True)
 
-# retreiving the stock data
-conn = connect_to_db()
-conn.autocommit = True
-cursor = conn.cursor()
+# collect this rerun's timings for the debug panel (METRICS_DEBUG_PANEL=1)
+metrics.start_capture()
 
-# load the list of stocks
-stocks = pd.read_sql(f"SELECT DISTINCT ticker FROM public.lu_stock order by ticker", conn)
+# query results cached across sessions, validated against each ticker's version stamp
+query_cache = get_query_cache()
+refresh_queue = get_refresh_queue()
+
+# load the list of stocks (connections come from a pool shared by every session
+# of this Streamlit server process, so reruns don't pay connection setup)
+with connection() as conn:
+    stocks = pd.read_sql("SELECT DISTINCT ticker FROM public.lu_stock order by ticker", conn)
 
 # sidebar
 with st.sidebar:
@@ -78,27 +151,26 @@ with st.sidebar:
         selected_stock = st.selectbox('select a stock', stocks, index=0)
     with col2:
         pass
+    compare = st.toggle('compare tickers')
+    compare_tickers = st.multiselect('tickers to compare', stocks['ticker'], default=[selected_stock]) if compare else []
 
-# Load the data for the selected stock
-stock_metadata = load_stock_metadata(selected_stock)
-stock_data = load_stock_data(selected_stock)
-stock_news = load_stock_news(selected_stock)
+# Load the data for the selected stock (one small validation query when cached)
+data_version = load_data_version(selected_stock)
+stock_metadata = load_stock_metadata(selected_stock, data_version)
+stock_stats = load_stock_stats(selected_stock, data_version)
+news_pages_key = f"news_pages_{selected_stock}"
+stock_news, more_news = load_news_pages(selected_stock, data_version, st.session_state.get(news_pages_key, 1))
 
 with st.sidebar:
     with refreshCol:
             st.write("")
             if st.button('refresh data'):
-                text_placeholder = st.empty() # placeholder for the text
-                current_time = datetime.now(pytz.timezone('US/Pacific'))
-                last_updated = pd.to_datetime(stock_metadata['last_updated'][0]).tz_localize('US/Pacific')
-                if last_updated >= (current_time - timedelta(minutes=15)):
-                # if False:
-                    text_placeholder.write("data can only be refreshed once every 15 minutes.")
-                else:
-                    refresh_database()
-                    text_placeholder.write("data refreshed successfully.")
-                time.sleep(5) # wait for 5 seconds
-                text_placeholder.empty() # clear the text
+                # the viewed ticker jumps the queue; the rest refresh behind it in the background
+                refresh_queue.submit([selected_stock], HIGH)
+                refresh_queue.submit(load_tickers(), LOW)
+                st.session_state['awaiting_refresh'] = selected_stock
+    if refresh_queue.progress()['active'] or st.session_state.get('awaiting_refresh'):
+        refresh_progress(refresh_queue)
 
 # display the news in the sidebar
 with st.sidebar:
@@ -111,11 +183,26 @@ with st.sidebar:
         st.write("")
 
         stock_news_list(stock_news)
+        if more_news and st.button('load more'):
+            st.session_state[news_pages_key] = st.session_state.get(news_pages_key, 1) + 1
+            st.rerun()
 
 
-# display the stock header and chart
-stock_header_with_info(stock_metadata, stock_data)
-st.write("---")
-stock_chart(stock_data, stock_metadata)
-
-
+# display the comparison of the picked tickers, or the stock header and chart
+if compare_tickers:
+    comparison_view(lambda start_date: load_close_matrix(compare_tickers, start_date))
+else:
+    stock_header_with_info(stock_metadata, stock_stats)
+    st.write("---")
+    stock_chart(lambda start_date, resolution: load_stock_data(selected_stock, data_version, start_date, resolution),
+                stock_metadata, stock_stats,
+                lambda start_date, columns: load_indicators(selected_stock, data_version, start_date, columns),
+                load_forecast(selected_stock, data_version))
+
+# per-rerun timings of the loaders and components above
+if metrics.debug_panel_enabled():
+    with st.sidebar:
+        metrics_debug_panel(metrics.stop_capture())
+
+# export this rerun's timings (a no-op unless METRICS=prometheus)
+metrics.flush()
@@ -0,0 +1,54 @@
+import json
+import sys
+
+# metrics compared between runs, and whether a higher value is better
+METRICS = {
+    'rows_per_s': True,
+    'articles_per_s': True,
+    'median_ms': False,
+    'p95_ms': False,
+    'payload_bytes': False,
+}
+
+# changes smaller than this share are reported as unchanged
+NOISE = 0.05
+
+
+def load(path):
+    with open(path) as file:
+        report = json.load(file)
+    return report['meta'], {(result['benchmark'], result['case']): result for result in report['results']}
+
+
+def compare(baseline_path, candidate_path):
+    """
+    prints every shared metric of two benchmark result files with its relative change
+    """
+    baseline_meta, baseline = load(baseline_path)
+    candidate_meta, candidate = load(candidate_path)
+    for key in ('tickers', 'years', 'repeat', 'seed', 'backend'):
+        if baseline_meta.get(key) != candidate_meta.get(key):
+            print(f"⚠️ runs differ in {key}: {baseline_meta.get(key)} vs {candidate_meta.get(key)}")
+
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        for metric, higher_is_better in METRICS.items():
+            if metric not in baseline[key] or metric not in candidate[key]:
+                continue
+            before, after = baseline[key][metric], candidate[key][metric]
+            change = (after - before) / before if before else 0.0
+            if abs(change) < NOISE:
+                status = '  '
+            elif (change > 0) == higher_is_better:
+                status = '✅'
+            else:
+                status = '❌'
+                regressions += 1
+            print(f"{status} {key[0]:<7} {key[1]:<15} {metric:<14} {before:>14,.2f} -> {after:>14,.2f} ({change:+.1%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m benchmarks.compare BASELINE.json CANDIDATE.json")
+    sys.exit(1 if compare(sys.argv[1], sys.argv[2]) else 0)
@@ -0,0 +1,239 @@
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# make the repo root importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import TICKER_PREFIX, bench_tickers, generate_history, generate_news
+from data.create_db import create_database
+from data.db import close_pools, connection, connection_kwargs
+from data.load_data import INSERT_METHODS, insert_stock_data, insert_stock_news, refresh_stock_stats, update_rollups, \
+    update_watermark
+from data.queries import CHART_COLUMNS, fetch_close_matrix, fetch_price_history, fetch_stock_news
+from ui.components import TIME_FRAME_RESOLUTIONS, build_stock_chart, time_frame_start, to_time_period
+
+# pgserver is optional; it provides the embedded throwaway Postgres used by --embedded
+try:
+    import pgserver
+except ImportError:
+    pgserver = None
+
+# time frames offered by the chart
+TIME_FRAMES = ('1w', '1m', '6m', '1y', '5y', 'max')
+
+# tickers sampled for the per-request latency benchmarks
+LATENCY_SAMPLE = 5
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def timings(func, repeat):
+    """
+    wall-clock seconds of repeat calls to func, after one untimed warm-up call
+    """
+    func()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def latency(seconds):
+    return {'median_ms': float(np.median(seconds) * 1000), 'p95_ms': float(np.percentile(seconds, 95) * 1000)}
+
+
+def clear_bench_data():
+    """
+    removes every synthetic ticker's rows, so each run starts from the same state
+    """
+    with connection() as conn, conn.cursor() as cursor:
+        for table in ('stocks', 'ingest_watermark', 'stock_rollups', 'stock_stats', 'stock_news_tickers',
+                      'stock_news'):
+            cursor.execute(f"DELETE FROM {table} WHERE ticker LIKE %s;", (f"{TICKER_PREFIX}%",))
+
+
+def bench_ingest(histories):
+    """
+    bulk insert throughput of every insert method, one transaction per ticker like a refresh
+    """
+    results = []
+    rows = sum(len(hist) for hist in histories.values())
+    for method in INSERT_METHODS:
+        clear_bench_data()
+        start = time.perf_counter()
+        for ticker, hist in histories.items():
+            with connection() as conn, conn.cursor() as cursor:
+                insert_stock_data(ticker, hist, cursor, method=method)
+        elapsed = time.perf_counter() - start
+        results.append({'benchmark': 'ingest', 'case': method, 'rows': rows, 'seconds': elapsed,
+                        'rows_per_s': rows / elapsed})
+        print(f"📈 ingest ({method}): {rows / elapsed:,.0f} rows/s")
+
+    # derived tables maintained at ingest time, over the whole history
+    start = time.perf_counter()
+    for ticker, hist in histories.items():
+        with connection() as conn, conn.cursor() as cursor:
+            update_watermark(ticker, hist, cursor)
+            update_rollups(ticker, hist.index.min().date(), cursor)
+            refresh_stock_stats(cursor, ticker)
+    elapsed = time.perf_counter() - start
+    results.append({'benchmark': 'ingest', 'case': 'derived tables', 'rows': rows, 'seconds': elapsed,
+                    'rows_per_s': rows / elapsed})
+    print(f"🧮 derived tables: {elapsed:.2f}s")
+    return results
+
+
+def bench_news(feeds, repeat):
+    """
+    bulk news write throughput and first-page read latency
+    """
+    start = time.perf_counter()
+    with connection() as conn, conn.cursor() as cursor:
+        articles = insert_stock_news(feeds, cursor)
+    elapsed = time.perf_counter() - start
+    results = [{'benchmark': 'news', 'case': 'write', 'articles': articles, 'seconds': elapsed,
+                'articles_per_s': articles / elapsed}]
+
+    sample = list(feeds)[:LATENCY_SAMPLE]
+    seconds = []
+    with connection() as conn:
+        for ticker in sample:
+            seconds.extend(timings(lambda: fetch_stock_news(conn, ticker), repeat))
+    results.append({'benchmark': 'news', 'case': 'first page', **latency(seconds)})
+    print(f"📰 news: {articles / elapsed:,.0f} articles/s written, first page {latency(seconds)['median_ms']:.1f}ms")
+    return results
+
+
+def bench_loaders_and_charts(tickers, repeat):
+    """
+    chart loader latency, and chart build time and payload size, per time frame
+    """
+    results = []
+    sample = tickers[:LATENCY_SAMPLE]
+    with connection() as conn:
+        for time_frame in TIME_FRAMES:
+            start_date = time_frame_start(to_time_period(time_frame))
+            resolution = TIME_FRAME_RESOLUTIONS.get(time_frame, 'D')
+            seconds = []
+            for ticker in sample:
+                seconds.extend(timings(lambda: fetch_price_history(conn, ticker, start_date, CHART_COLUMNS,
+                                                                   resolution), repeat))
+            stock_data = fetch_price_history(conn, sample[0], start_date, CHART_COLUMNS, resolution)
+            results.append({'benchmark': 'loader', 'case': time_frame, 'resolution': resolution,
+                            'rows': len(stock_data), **latency(seconds)})
+
+            build_seconds = timings(lambda: build_stock_chart(stock_data), repeat)
+            payload = build_stock_chart(stock_data).to_json()
+            results.append({'benchmark': 'chart', 'case': time_frame, 'rows': len(stock_data),
+                            'payload_bytes': len(payload), **latency(build_seconds)})
+            print(f"📊 {time_frame}: load {latency(seconds)['median_ms']:.1f}ms ({len(stock_data)} rows), "
+                  f"build {latency(build_seconds)['median_ms']:.1f}ms, payload {len(payload) / 1024:.0f} KiB")
+    return results
+
+
+def bench_matrix(tickers, repeat):
+    """
+    cross-ticker read latency: every ticker's full daily close history as one (date x ticker) matrix
+    """
+    with connection() as conn:
+        seconds = timings(lambda: fetch_close_matrix(conn, tickers), repeat)
+        closes = fetch_close_matrix(conn, tickers)
+    print(f"🧮 close matrix: {latency(seconds)['median_ms']:.1f}ms ({closes.shape[0]} days x {closes.shape[1]} tickers)")
+    return [{'benchmark': 'matrix', 'case': 'all tickers', 'rows': int(closes.notna().sum().sum()), **latency(seconds)}]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(tickers=20, years=10, repeat=5, seed=0, output=None):
+    """
+    runs every benchmark against the database in POSTGRES_URL and writes the results as JSON
+    """
+    create_database()
+    names = bench_tickers(tickers)
+    histories = {ticker: generate_history(ticker, years, seed) for ticker in names}
+
+    print(f"----- benchmarking {tickers} tickers x {years} years ... -----")
+    results = bench_ingest(histories)
+    results += bench_news(generate_news(names, seed=seed), repeat)
+    results += bench_loaders_and_charts(names, repeat)
+    results += bench_matrix(names, repeat)
+    clear_bench_data()
+
+    report = {
+        'meta': {
+            'timestamp': dt.datetime.now(dt.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'tickers': tickers, 'years': years, 'repeat': repeat, 'seed': seed,
+            'backend': os.getenv('DB_ENV', 'prod'),
+        },
+        'results': results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{dt.datetime.now(dt.timezone.utc):%Y%m%dT%H%M%S}.json")
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2, default=str)
+    print(f"📝 results written to {output}.")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ingest, query and render benchmarks on synthetic data")
+    parser.add_argument('--tickers', type=int, default=20, help="number of synthetic tickers")
+    parser.add_argument('--years', type=float, default=10, help="years of daily history per ticker")
+    parser.add_argument('--repeat', type=int, default=5, help="timed repetitions per latency measurement")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--embedded', action='store_true',
+                        help="run against a throwaway embedded Postgres (needs `pip install pgserver`)")
+    parser.add_argument('--duckdb', action='store_true',
+                        help="run against a throwaway embedded DuckDB file (needs `pip install duckdb`)")
+    args = parser.parse_args()
+
+    # never benchmark against the configured database by accident: DB_ENV (e.g. 'dev'
+    # from .env) is overridden too, since it decides which settings connection() uses
+    if args.duckdb:
+        os.environ['DB_ENV'] = 'embedded'
+        os.environ['DUCKDB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='stock-models-bench-'), 'bench.duckdb')
+        throwaway = dict(path=os.environ['DUCKDB_PATH'])
+    elif args.embedded:
+        if pgserver is None:
+            sys.exit("--embedded needs pgserver: pip install pgserver")
+        server = pgserver.get_server(tempfile.mkdtemp(prefix='stock-models-bench-'), cleanup_mode='delete')
+        os.environ['DB_ENV'] = 'prod'
+        os.environ['POSTGRES_URL'] = server.get_uri()
+        throwaway = dict(dsn=os.environ['POSTGRES_URL'])
+    elif os.getenv('BENCH_POSTGRES_URL'):
+        os.environ['DB_ENV'] = 'prod'
+        os.environ['POSTGRES_URL'] = os.environ['BENCH_POSTGRES_URL']
+        throwaway = dict(dsn=os.environ['POSTGRES_URL'])
+    else:
+        sys.exit("set BENCH_POSTGRES_URL to a throwaway database, or pass --embedded")
+    if connection_kwargs() != throwaway:
+        sys.exit(f"refusing to benchmark: DB_ENV '{os.environ['DB_ENV']}' doesn't resolve to the throwaway database")
+
+    try:
+        run(args.tickers, args.years, args.repeat, args.seed, args.output)
+    finally:
+        close_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+# synthetic tickers are named BENCH000, BENCH001, ... so they never collide with real ones
+TICKER_PREFIX = 'BENCH'
+
+
+def bench_tickers(count):
+    return [f"{TICKER_PREFIX}{i:03d}" for i in range(count)]
+
+
+def generate_history(ticker, years, seed=0, end=None):
+    """
+    yfinance-shaped daily OHLCV history (tz-aware index, Open/High/Low/Close/Volume columns)
+    covering the given number of years up to end (default today), reproducible per ticker and seed
+    """
+    end = end or dt.date.today()
+    index = pd.bdate_range(end - dt.timedelta(days=round(365.25 * years)), end, tz='America/New_York')
+    rng = np.random.default_rng([seed, *ticker.encode()])
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(index))))
+    open_ = close * (1 + rng.normal(0, 0.004, len(index)))
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, len(index))),
+        'Low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, len(index))),
+        'Close': close,
+        'Volume': rng.integers(100_000, 20_000_000, len(index)),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=index)
+
+
+def generate_news(tickers, per_ticker=20, shared_share=0.25, seed=0):
+    """
+    yfinance-shaped news feeds per ticker; shared_share of each feed are articles that
+    also appear in the next ticker's feed, like stories mentioning several companies
+    """
+    rng = np.random.default_rng(seed)
+    now = int(dt.datetime.now(dt.timezone.utc).timestamp())
+    feeds = {ticker: [] for ticker in tickers}
+    for i, ticker in enumerate(tickers):
+        neighbour = tickers[(i + 1) % len(tickers)]
+        for j in range(per_ticker):
+            shared = j < per_ticker * shared_share
+            article = {
+                'uuid': f"bench-{ticker}-{j}",
+                'title': f"{ticker} synthetic headline {j}",
+                'publisher': 'Bench Wire',
+                'link': f"https://example.com/{ticker}/{j}",
+                'providerPublishTime': now - int(rng.integers(0, 30 * 86400)),
+                'type': 'STORY',
+                'relatedTickers': [ticker, neighbour] if shared else [ticker],
+            }
+            feeds[ticker].append(article)
+            if shared:
+                feeds[neighbour].append(article)
+    return feeds
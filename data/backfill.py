@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+# price columns compared between stored and freshly fetched bars
+PRICE_COLUMNS = ('open_price', 'close_price', 'high_price', 'low_price')
+
+# stored and fetched prices further apart than this mean yfinance has re-adjusted the
+# history; it is above the stocks table's rounding to cents
+PRICE_TOLERANCE = 0.011
+
+# overlap bars (before the last stored one) needed to call a common shift a re-adjustment
+MIN_OVERLAP_BARS = 2
+
+# corporate action columns of a yfinance history frame, and the backfill reason they give
+ACTION_COLUMNS = {'Stock Splits': 'split', 'Dividends': 'dividend'}
+
+
+def price_frame(hist_data):
+    """
+    the prices of a yfinance history frame, indexed by date like stored_prices()
+    """
+    return pd.DataFrame({
+        'open_price': hist_data['Open'].astype(float).to_numpy(),
+        'close_price': hist_data['Close'].astype(float).to_numpy(),
+        'high_price': hist_data['High'].astype(float).to_numpy(),
+        'low_price': hist_data['Low'].astype(float).to_numpy(),
+    }, index=pd.Index([date.date() for date in hist_data.index], name='date'))
+
+
+def stored_prices(cursor, ticker_symbol, since_date=None):
+    """
+    the ticker's stored prices from since_date onwards (all history if None), indexed by date
+    """
+    query = f"""
+        SELECT date::date AS date, {', '.join(f'{column}::float8' for column in PRICE_COLUMNS)}
+        FROM stocks WHERE ticker = %(ticker)s
+    """
+    if since_date is not None:
+        query += " AND date >= %(since)s"
+    cursor.execute(query + " ORDER BY date;", {'ticker': ticker_symbol, 'since': since_date})
+    return pd.DataFrame(cursor.fetchall(), columns=('date',) + PRICE_COLUMNS).set_index('date')
+
+
+def compare_prices(fetched, stored):
+    """
+    which fetched bars are missing from stored, which differ from their stored bar beyond
+    PRICE_TOLERANCE, and the largest difference seen
+    """
+    aligned = stored.reindex(fetched.index)
+    missing = aligned.isna().all(axis=1)
+    diff = (fetched[list(PRICE_COLUMNS)] - aligned[list(PRICE_COLUMNS)]).abs()
+    changed = (diff > PRICE_TOLERANCE).any(axis=1) & ~missing
+    return missing, changed, float(diff.max().max()) if changed.any() else 0.0
+
+
+def common_ratio(fetched, stored):
+    """
+    the factor every fetched price equals its stored price times (within PRICE_TOLERANCE),
+    or None when the differences don't share one. a split or dividend re-adjustment scales
+    all earlier prices alike; a corrected or mid-session bar doesn't.
+    """
+    fetched_prices = fetched[list(PRICE_COLUMNS)].to_numpy(dtype=float)
+    stored_values = stored.reindex(fetched.index)[list(PRICE_COLUMNS)].to_numpy(dtype=float)
+    ratio = float(np.median(fetched_prices / stored_values))
+    if np.all(np.abs(fetched_prices - stored_values * ratio) <= PRICE_TOLERANCE):
+        return ratio
+    return None
+
+
+def detect_adjustment(cursor, ticker_symbol, hist_data):
+    """
+    checks incrementally fetched bars against the stored ones for signs that yfinance has
+    re-adjusted the ticker's earlier history: a split or dividend on a bar not stored yet,
+    or an overlap window whose prices all changed by a common ratio ('mismatch').
+    the last stored bar is not compared, since it may have been stored mid-session, and
+    a difference in single bars is a correction the overlap upsert takes care of.
+    returns (reason, action date) or None.
+    """
+    fetched = price_frame(hist_data)
+    stored = stored_prices(cursor, ticker_symbol, min(fetched.index))
+    if stored.empty:
+        return None
+    last_date = stored.index.max()
+
+    new = [date > last_date for date in fetched.index]
+    for column, reason in ACTION_COLUMNS.items():
+        if column in hist_data:
+            actions = hist_data[column].fillna(0).to_numpy() != 0
+            dates = fetched.index[actions & new]
+            if len(dates):
+                return reason, dates[0]
+
+    overlap = fetched[[date < last_date and date in stored.index for date in fetched.index]]
+    _, changed, _ = compare_prices(overlap, stored)
+    if len(overlap) >= MIN_OVERLAP_BARS and changed.all() and common_ratio(overlap, stored) is not None:
+        return 'mismatch', overlap.index[0]
+    return None
+
+
+def rebuild_features(conn, cursor, ticker_symbol):
+    """
+    recomputes the ticker's stored features from the rewritten bars in the caller's
+    transaction, so readers never see them missing or built from the old prices.
+    models imports the data layer, so it is only imported here.
+    """
+    from models.features import compute_batch
+    compute_batch(conn, cursor, [ticker_symbol], full=True)
+
+
+def record_backfill(cursor, ticker_symbol, reason, action_date, rewritten_dates, bars_written, max_price_diff):
+    """
+    adds a backfill_audit row describing one targeted re-ingest
+    """
+    cursor.execute("""
+        INSERT INTO backfill_audit (ticker, reason, action_date, range_start, range_end, bars_rewritten,
+                                    bars_written, max_price_diff)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
+    """, (ticker_symbol, reason, action_date, min(rewritten_dates, default=None),
+          max(rewritten_dates, default=None), len(rewritten_dates), bars_written, max_price_diff))
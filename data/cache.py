@@ -0,0 +1,83 @@
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+
+def estimate_size(value):
+    """
+    approximate memory footprint of a cached value in bytes
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return sys.getsizeof(value)
+
+
+class VersionedCache:
+    """
+    process-wide LRU cache for query results, bounded by memory.
+    every entry remembers the version stamp it was loaded under; a lookup with a
+    different stamp (e.g. after an ingestion updated the ticker) reloads the entry.
+    cached values are shared between sessions and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (version, value, size)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, version, loader):
+        """
+        return the cached value for key if it was loaded under version, else call loader()
+        """
+        value = self.get(key, version)
+        if value is not None:
+            return value
+        value = loader()
+        self.put(key, version, value)
+        return value
+
+    def get(self, key, version):
+        """
+        return the cached value for key if it was loaded under version, else None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, value):
+        """
+        store value under key, evicting least recently used entries to stay within max_bytes
+        """
+        size = estimate_size(value)
+        with self.lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (version, value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                self._discard(next(iter(self.entries)))
+
+    def invalidate(self, match=None):
+        """
+        drop every entry, or only those whose key satisfies match(key)
+        """
+        with self.lock:
+            for key in [key for key in self.entries if match is None or match(key)]:
+                self._discard(key)
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
@@ -1,11 +1,15 @@
 # libraries
-import yfinance as yf
 import pandas as pd
 import sys
 import os
 
+# make the repo root importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.sources import market_data
+
 def check_ticker(ticker):
-    stock = yf.Ticker(ticker)
+    stock = market_data().Ticker(ticker)
     # get stock METADATA
     stock_history = stock.history(period='1d')
     stock_metadata = stock.history_metadata
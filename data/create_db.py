@@ -1,22 +1,85 @@
-from .load_data import connect_to_db
+import datetime as dt
+import os
+from .db import connect_to_db, is_embedded
+from .embedded import to_duckdb
+from .load_data import refresh_stock_stats
 
-# create table queries
-CREATE_TABLE_QUERIES = [
-    # create the stocks table
+# storage layouts for the stocks table: 'heap' is the original single table,
+# 'partitioned' is range-partitioned by year with float prices, a covering
+# index for the chart query and a BRIN index on date
+STORAGE_LAYOUTS = ('heap', 'partitioned')
+
+# create stocks table queries, per storage layout
+STOCKS_TABLE_QUERIES = {
+    'heap': [
+        """
+        CREATE TABLE IF NOT EXISTS stocks (
+            id SERIAL PRIMARY KEY,
+            ticker VARCHAR(10) NOT NULL,
+            date TIMESTAMPTZ NOT NULL,
+            open_price NUMERIC(10, 2),
+            close_price NUMERIC(10, 2),
+            high_price NUMERIC(10, 2),
+            low_price NUMERIC(10, 2),
+            volume BIGINT,
+            UNIQUE (ticker, date)
+        );
+        """
+    ],
+
+    'partitioned': [
+        """
+        CREATE TABLE IF NOT EXISTS stocks (
+            ticker VARCHAR(10) NOT NULL,
+            date TIMESTAMPTZ NOT NULL,
+            open_price DOUBLE PRECISION,
+            close_price DOUBLE PRECISION,
+            high_price DOUBLE PRECISION,
+            low_price DOUBLE PRECISION,
+            volume BIGINT,
+            PRIMARY KEY (ticker, date)
+        ) PARTITION BY RANGE (date);
+        """,
+
+        # catches bars outside the yearly partitions
+        """
+        CREATE TABLE IF NOT EXISTS stocks_default PARTITION OF stocks DEFAULT;
+        """,
+
+        # lets the chart query (ticker, date range, newest first) run as an index-only scan
+        """
+        CREATE INDEX IF NOT EXISTS stocks_chart_covering_idx ON stocks (ticker, date DESC)
+            INCLUDE (open_price, close_price, high_price, low_price, volume);
+        """,
+
+        # cheap date-range pruning for cross-ticker scans
+        """
+        CREATE INDEX IF NOT EXISTS stocks_date_brin_idx ON stocks USING BRIN (date);
+        """
+    ]
+}
+
+# first year given its own stocks partition
+FIRST_PARTITION_YEAR = 1962
+
+# partitions are created this many years ahead of the current year
+PARTITION_YEARS_AHEAD = 5
+
+
+def create_stock_partitions(cursor, first_year=FIRST_PARTITION_YEAR, last_year=None):
     """
-    CREATE TABLE IF NOT EXISTS stocks (
-        id SERIAL PRIMARY KEY,
-        ticker VARCHAR(10) NOT NULL,
-        date TIMESTAMPTZ NOT NULL,
-        open_price NUMERIC(10, 2),
-        close_price NUMERIC(10, 2),
-        high_price NUMERIC(10, 2),
-        low_price NUMERIC(10, 2),
-        volume BIGINT,
-        UNIQUE (ticker, date)
-    );
-    """,
+    creates the yearly partitions of the partitioned stocks table
+    """
+    last_year = last_year or dt.date.today().year + PARTITION_YEARS_AHEAD
+    for year in range(first_year, last_year + 1):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS stocks_{year} PARTITION OF stocks
+            FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01');
+        """)
 
+
+# create table queries
+CREATE_TABLE_QUERIES = [
     # create the stock metadata table
     """
     CREATE TABLE IF NOT EXISTS lu_stock (
@@ -61,21 +124,292 @@ CREATE_TABLE_QUERIES = [
         UNIQUE (ticker, uuid)
     );
     """
+    ,
+
+    # create the article-to-ticker mapping: an article is stored once in stock_news
+    # and linked here to every ticker it mentions
+    """
+    CREATE TABLE IF NOT EXISTS stock_news_tickers (
+        uuid VARCHAR(255) NOT NULL REFERENCES stock_news (uuid) ON DELETE CASCADE,
+        ticker VARCHAR(10) NOT NULL,
+        provider_publish_time TIMESTAMPTZ,
+        PRIMARY KEY (ticker, uuid)
+    );
+    """
+    ,
+
+    # newest-first news for one ticker is read straight off this index
+    """
+    CREATE INDEX IF NOT EXISTS stock_news_tickers_ticker_time_idx
+        ON stock_news_tickers (ticker, provider_publish_time DESC) INCLUDE (uuid);
+    """
+    ,
+
+    # create the ingestion watermark table (latest stored bar per ticker)
+    """
+    CREATE TABLE IF NOT EXISTS ingest_watermark (
+        ticker VARCHAR(10) PRIMARY KEY,
+        last_date TIMESTAMPTZ NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """
+    ,
+
+    # create the weekly ('W') / monthly ('M') OHLC rollups used by long-range charts
+    """
+    CREATE TABLE IF NOT EXISTS stock_rollups (
+        ticker VARCHAR(10) NOT NULL,
+        period CHAR(1) NOT NULL,
+        period_start DATE NOT NULL,
+        open_price NUMERIC(12, 4),
+        close_price NUMERIC(12, 4),
+        high_price NUMERIC(12, 4),
+        low_price NUMERIC(12, 4),
+        volume BIGINT,
+        PRIMARY KEY (ticker, period, period_start)
+    );
+    """
+    ,
+
+    # create the per-ticker summary statistics table read by the page header and price widgets
+    """
+    CREATE TABLE IF NOT EXISTS stock_stats (
+        ticker VARCHAR(10) PRIMARY KEY,
+        last_date DATE,
+        last_close NUMERIC(12, 4),
+        high_52_week NUMERIC(12, 4),
+        low_52_week NUMERIC(12, 4),
+        avg_volume_30_day BIGINT,
+        start_price_1w NUMERIC(12, 4),
+        start_price_1m NUMERIC(12, 4),
+        start_price_6m NUMERIC(12, 4),
+        start_price_1y NUMERIC(12, 4),
+        start_price_5y NUMERIC(12, 4),
+        start_price_max NUMERIC(12, 4),
+        change_1w NUMERIC(12, 4),
+        change_1m NUMERIC(12, 4),
+        change_6m NUMERIC(12, 4),
+        change_1y NUMERIC(12, 4),
+        change_5y NUMERIC(12, 4),
+        change_max NUMERIC(12, 4),
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """
+    ,
+
+    # create the intraday bars table: ingested 1-minute bars plus the 5m/15m/1h/1d
+    # buckets rolled up from them (minutes = bar size, last_ts = newest 1-minute bar merged)
+    """
+    CREATE TABLE IF NOT EXISTS intraday_bars (
+        ticker VARCHAR(10) NOT NULL,
+        minutes SMALLINT NOT NULL,
+        ts TIMESTAMPTZ NOT NULL,
+        open_price REAL,
+        high_price REAL,
+        low_price REAL,
+        close_price REAL,
+        volume BIGINT,
+        last_ts TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (ticker, minutes, ts)
+    );
+    """
+    ,
+
+    # create the technical indicator table maintained by models/features.py
+    """
+    CREATE TABLE IF NOT EXISTS features (
+        ticker VARCHAR(10) NOT NULL,
+        date DATE NOT NULL,
+        close_price DOUBLE PRECISION,
+        ret_1 DOUBLE PRECISION,
+        ret_5 DOUBLE PRECISION,
+        ret_20 DOUBLE PRECISION,
+        ret_lag_1 DOUBLE PRECISION,
+        ret_lag_2 DOUBLE PRECISION,
+        ret_lag_5 DOUBLE PRECISION,
+        sma_10 DOUBLE PRECISION,
+        sma_20 DOUBLE PRECISION,
+        sma_50 DOUBLE PRECISION,
+        ema_12 DOUBLE PRECISION,
+        ema_26 DOUBLE PRECISION,
+        macd DOUBLE PRECISION,
+        macd_signal DOUBLE PRECISION,
+        macd_hist DOUBLE PRECISION,
+        rsi_14 DOUBLE PRECISION,
+        volatility_20 DOUBLE PRECISION,
+        PRIMARY KEY (ticker, date)
+    );
+    """
+    ,
+
+    # create the per-ticker state the feature engine resumes from: the last computed
+    # date, the EMA seeds and the closes still inside the rolling windows
+    """
+    CREATE TABLE IF NOT EXISTS feature_state (
+        ticker VARCHAR(10) PRIMARY KEY,
+        last_date DATE NOT NULL,
+        ema_12 DOUBLE PRECISION,
+        ema_26 DOUBLE PRECISION,
+        macd_signal DOUBLE PRECISION,
+        rsi_gain DOUBLE PRECISION,
+        rsi_loss DOUBLE PRECISION,
+        close_tail DOUBLE PRECISION[] NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """
+    ,
+
+    # create the model registry: one row per serialized model version (models/registry.py)
+    """
+    CREATE TABLE IF NOT EXISTS model_registry (
+        model_id SERIAL PRIMARY KEY,
+        ticker VARCHAR(10) NOT NULL,
+        family VARCHAR(50) NOT NULL,
+        horizon SMALLINT NOT NULL,
+        version INT NOT NULL,
+        artifact_path TEXT NOT NULL,
+        trained_through DATE NOT NULL,
+        input_columns TEXT[] NOT NULL,
+        metrics JSONB,
+        is_active BOOLEAN NOT NULL DEFAULT FALSE,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (ticker, family, horizon, version)
+    );
+    """
+    ,
+
+    # at most one active model per ticker and horizon
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS model_registry_active_idx
+        ON model_registry (ticker, horizon) WHERE is_active;
+    """
+    ,
+
+    # create the forecast table written by batch inference (models/predict.py);
+    # the primary key serves the page's latest-forecast read
+    """
+    CREATE TABLE IF NOT EXISTS predictions (
+        ticker VARCHAR(10) NOT NULL,
+        horizon SMALLINT NOT NULL,
+        as_of_date DATE NOT NULL,
+        target_date DATE NOT NULL,
+        model_id INT NOT NULL REFERENCES model_registry (model_id),
+        predicted_return DOUBLE PRECISION,
+        predicted_price DOUBLE PRECISION,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (ticker, horizon, as_of_date)
+    );
+    """
+    ,
+
+    # create the audit trail of targeted re-ingests after yfinance re-adjusted a
+    # ticker's history (data/backfill.py): why, which dates and how much changed
+    """
+    CREATE TABLE IF NOT EXISTS backfill_audit (
+        audit_id SERIAL PRIMARY KEY,
+        ticker VARCHAR(10) NOT NULL,
+        reason VARCHAR(20) NOT NULL,
+        action_date DATE,
+        range_start DATE,
+        range_end DATE,
+        bars_rewritten INT NOT NULL,
+        bars_written INT NOT NULL,
+        max_price_diff DOUBLE PRECISION,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """
 ]
 
-def create_database():
+# backfill queries, safe to re-run on an existing database
+BACKFILL_QUERIES = [
+    # seed watermarks for tickers loaded before the watermark table existed
+    """
+    INSERT INTO ingest_watermark (ticker, last_date)
+    SELECT ticker, MAX(date) FROM stocks GROUP BY ticker
+    ON CONFLICT (ticker) DO UPDATE SET
+        last_date = GREATEST(ingest_watermark.last_date, EXCLUDED.last_date);
+    """
+    ,
+
+    # link articles stored before the mapping table existed to their ticker
+    """
+    INSERT INTO stock_news_tickers (uuid, ticker, provider_publish_time)
+    SELECT uuid, ticker, provider_publish_time FROM stock_news
+    ON CONFLICT (ticker, uuid) DO NOTHING;
+    """
+    ,
+
+    # widen the prices of rollups created before they matched stock_stats' precision
+    # (one column per statement, as DuckDB only takes one ALTER command at a time)
+    *[f"ALTER TABLE stock_rollups ALTER COLUMN {column} TYPE NUMERIC(12, 4);"
+      for column in ('open_price', 'close_price', 'high_price', 'low_price')],
+
+    # build weekly and monthly rollups from the full daily history
+    """
+    INSERT INTO stock_rollups (ticker, period, period_start, open_price, close_price, high_price, low_price, volume)
+    SELECT ticker, period, date_trunc(unit, date)::date,
+           (array_agg(open_price ORDER BY date))[1],
+           (array_agg(close_price ORDER BY date DESC))[1],
+           MAX(high_price), MIN(low_price), SUM(volume)
+    FROM stocks, (VALUES ('W', 'week'), ('M', 'month')) AS periods (period, unit)
+    GROUP BY ticker, period, date_trunc(unit, date)
+    ON CONFLICT (ticker, period, period_start) DO NOTHING;
+    """
+    ,
+
+    # drop hourly / daily intraday buckets stored before buckets were aligned to exchange time
+    """
+    DELETE FROM intraday_bars
+    WHERE (minutes = 60 AND extract(minute FROM ts AT TIME ZONE 'America/New_York') <> 30)
+       OR (minutes = 1440 AND (ts AT TIME ZONE 'America/New_York')::time <> '00:00');
+    """
+]
+
+def ddl_queries(queries, embedded=False):
+    """
+    the given DDL as is, or its DuckDB equivalent for the embedded database
+    """
+    if not embedded:
+        return queries
+    return [query for query in map(to_duckdb, queries) if query is not None]
+
+
+def create_database(layout=None):
+    """
+    creates every table; layout picks the stocks storage layout
+    (defaults to the STORAGE_LAYOUT env variable, else 'heap')
+    """
+    layout = layout or os.getenv('STORAGE_LAYOUT', 'heap')
+    if layout not in STORAGE_LAYOUTS:
+        raise ValueError(f"Invalid storage layout '{layout}' specified. Use one of {STORAGE_LAYOUTS}.")
+
+    conn = None
     try:
-        # connect to the PostgreSQL server
+        # connect to the PostgreSQL server (or open the embedded database)
         conn = connect_to_db()
         conn.autocommit = True
         cursor = conn.cursor()
+        embedded = is_embedded(conn)
+        if embedded and layout != 'heap':
+            raise ValueError(f"Invalid storage layout '{layout}' specified. The embedded database uses 'heap'.")
 
         # Create tables
-        for query in CREATE_TABLE_QUERIES:
+        for query in ddl_queries(STOCKS_TABLE_QUERIES[layout], embedded):
+            cursor.execute(query)
+        if layout == 'partitioned':
+            create_stock_partitions(cursor)
+        for query in ddl_queries(CREATE_TABLE_QUERIES, embedded):
             cursor.execute(query)
         
         print("Tables created successfully.")
 
+        # backfill derived tables from existing data
+        for query in BACKFILL_QUERIES:
+            cursor.execute(query)
+        refresh_stock_stats(cursor)
+
+        print("Derived tables backfilled successfully.")
+
     except Exception as e:
         print(f"Error creating database: {e}")
     
@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2 import extras as pg_extras
+from dotenv import load_dotenv
+from . import embedded
+
+# load env variables once per process
+load_dotenv()
+
+# 'dev' is a local Postgres, 'prod' the hosted one, 'embedded' a local DuckDB file (DUCKDB_PATH)
+ENVIRONMENTS = ('dev', 'prod', 'embedded')
+
+
+def default_env():
+    """
+    environment used when none is passed (DB_ENV, else 'prod'), so the UI, ingestion
+    and models can all be pointed at the embedded database with DB_ENV=embedded
+    """
+    return os.getenv('DB_ENV', 'prod')
+
+
+# pooled connections idle for longer than this are pinged before being handed out
+HEALTH_CHECK_INTERVAL = 30
+
+
+def connection_kwargs(env=None):
+    """
+    connection arguments for the given environment.
+    Use 'env="dev"' for local db, 'env="prod"' for hosted db and 'env="embedded"' for the DuckDB file.
+    """
+    env = env or default_env()
+    if env == "dev":
+        # local DB credentials
+        return dict(
+            dbname=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            host=os.getenv('DB_HOST', 'localhost'),
+            port=os.getenv('DB_PORT', '5432'))
+
+    elif env == "prod":
+        # hosted DB credentials, full connection URL
+        return dict(dsn=os.getenv('POSTGRES_URL'))
+
+    elif env == "embedded":
+        # embedded DuckDB file, opened in-process
+        return dict(path=os.getenv('DUCKDB_PATH', embedded.DEFAULT_PATH))
+
+    else:
+        raise ValueError(f"Invalid environment '{env}' specified. Use one of {ENVIRONMENTS}.")
+
+
+def connect_to_db(env=None):
+    """
+    Open a dedicated (unpooled) connection to the database.
+    Use 'env="dev"' for local db, 'env="prod"' for hosted db and 'env="embedded"' for the DuckDB file.
+    """
+    env = env or default_env()
+    if env == "embedded":
+        return embedded.connect(**connection_kwargs(env))
+    return psycopg2.connect(**connection_kwargs(env))
+
+
+def is_embedded(conn):
+    return isinstance(conn, embedded.EmbeddedConnection)
+
+
+def read_sql(query, conn, params=None):
+    """
+    pd.read_sql on a connection of either backend; the embedded database hands over its
+    columnar result directly. column types can differ between backends (e.g. NUMERIC
+    arrives as float, timestamps as datetime64), so callers normalize the columns they use
+    """
+    if is_embedded(conn):
+        return conn.read_frame(query, params)
+    return pd.read_sql(query, conn, params=params)
+
+
+def execute_values(cursor, query, rows, page_size=100):
+    """
+    psycopg2.extras.execute_values on a cursor of either backend
+    """
+    if isinstance(cursor, embedded.EmbeddedCursor):
+        return cursor.execute_values(query, rows, page_size)
+    return pg_extras.execute_values(cursor, query, rows, page_size=page_size)
+
+
+class ConnectionPool:
+    """
+    thread-safe psycopg2 pool that blocks instead of failing when exhausted
+    and health-checks connections that have been idle for a while
+    """
+
+    def __init__(self, env=None, minconn=1, maxconn=5):
+        self.pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **connection_kwargs(env))
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.last_used = {}
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - self.last_used.get(id(conn), 0) < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        self.slots.acquire()
+        try:
+            conn = self.pool.getconn()
+            if not self._healthy(conn):
+                # drop the broken connection and open a fresh one in its place
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+            return conn
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                    self.last_used[id(conn)] = time.monotonic()
+                except psycopg2.Error:
+                    pass
+            self.pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self.slots.release()
+
+    def closeall(self):
+        self.pool.closeall()
+
+
+# one pool per environment per process, shared by the UI, ingestion and models
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(env=None):
+    """
+    get (or lazily create) the process-wide connection pool for env.
+    pool sizes come from DB_POOL_MIN / DB_POOL_MAX.
+    """
+    env = env or default_env()
+    with _pools_lock:
+        if env == "embedded" and env not in _pools:
+            _pools[env] = embedded.EmbeddedPool(maxconn=int(os.getenv('DB_POOL_MAX', 5)), **connection_kwargs(env))
+        if env not in _pools:
+            _pools[env] = ConnectionPool(
+                env,
+                minconn=int(os.getenv('DB_POOL_MIN', 1)),
+                maxconn=int(os.getenv('DB_POOL_MAX', 5)))
+        return _pools[env]
+
+
+@contextmanager
+def connection(env=None):
+    """
+    borrow a pooled connection; commits on success, rolls back on error
+    and always returns the connection to the pool
+    """
+    db_pool = get_pool(env)
+    conn = db_pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        db_pool.putconn(conn)
+
+
+def close_pools():
+    """
+    close every pooled connection in this process
+    """
+    with _pools_lock:
+        for db_pool in _pools.values():
+            db_pool.closeall()
+        _pools.clear()
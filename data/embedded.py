@@ -0,0 +1,325 @@
+import io
+import os
+import re
+import threading
+from collections import namedtuple
+import pandas as pd
+
+# duckdb is optional; it is only needed for the embedded backend (DB_ENV=embedded)
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# the embedded database file, used unless DUCKDB_PATH says otherwise
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stocks.duckdb')
+
+# psycopg2 placeholders: %(name)s, %s and the %% escape
+PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+# Postgres clauses DuckDB doesn't accept, and their rewrites: temp tables only support
+# ON COMMIT PRESERVE ROWS (the staging table is truncated before every use anyway), and
+# CURRENT_TIMESTAMP is bound as a column name in an ON CONFLICT ... SET clause
+REWRITES = [
+    (re.compile(r"ON COMMIT DELETE ROWS", re.IGNORECASE), "ON COMMIT PRESERVE ROWS"),
+    (re.compile(r"=\s*CURRENT_TIMESTAMP\b", re.IGNORECASE), "= now()"),
+]
+
+# COPY <table> (<columns>) FROM STDIN, in Postgres' text format
+COPY_STATEMENT = re.compile(r"^\s*COPY\s+([\w.]+)\s*\(([^)]*)\)\s+FROM\s+STDIN\s*$", re.IGNORECASE)
+
+# statements whose result is a row count rather than rows
+DML_STATEMENT = re.compile(r"^\s*(INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+# cursor.description entry, readable by index (DB-API) or by name (psycopg2)
+Column = namedtuple('Column', ['name', 'type_code', 'display_size', 'internal_size', 'precision', 'scale', 'null_ok'])
+
+
+def rewrite(query):
+    for pattern, replacement in REWRITES:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+def translate(query, params):
+    """
+    a psycopg2 query and its parameters in DuckDB's placeholder style ($name or ?).
+    like psycopg2, a query without parameters is left untouched.
+    """
+    query = rewrite(query)
+    if params is None:
+        return query, None
+
+    names = []
+
+    def placeholder(match):
+        if match.group(0) == '%%':
+            return '%'
+        if match.group(1):
+            names.append(match.group(1))
+            return f"${match.group(1)}"
+        return '?'
+
+    query = PLACEHOLDER.sub(placeholder, query)
+    if isinstance(params, dict):
+        # DuckDB rejects named parameters the query doesn't use
+        params = {name: params[name] for name in names}
+    return query, params
+
+
+def to_duckdb(query):
+    """
+    the DuckDB equivalent of one of create_db's Postgres DDL statements, or None when it
+    has no equivalent: SERIAL columns draw from a sequence, foreign keys are dropped (DuckDB
+    forbids updating or deleting referenced rows, which the upserts do), JSONB is JSON, and
+    secondary indexes are skipped, since DuckDB prunes its columnar scans with min/max zone
+    maps and ART indexes would only slow the bulk writes down
+    """
+    if re.match(r"^\s*CREATE\s+(UNIQUE\s+)?INDEX", query, re.IGNORECASE):
+        return None
+    table = re.search(r"CREATE TABLE IF NOT EXISTS (\w+)", query).group(1)
+    sequences = re.findall(r"(\w+) SERIAL PRIMARY KEY", query)
+    query = re.sub(r"(\w+) SERIAL PRIMARY KEY",
+                   lambda match: f"{match.group(1)} INTEGER PRIMARY KEY DEFAULT nextval('{table}_{match.group(1)}_seq')",
+                   query)
+    query = re.sub(r"\s+REFERENCES \w+ \(\w+\)( ON DELETE CASCADE)?", "", query)
+    query = query.replace('JSONB', 'JSON')
+    return ''.join(f"CREATE SEQUENCE IF NOT EXISTS {table}_{column}_seq;\n" for column in sequences) + query
+
+
+class EmbeddedCursor:
+    """
+    psycopg2-like cursor over an EmbeddedConnection: psycopg2 placeholders, the rows of
+    the last statement fetched eagerly (like psycopg2's client-side cursors), rowcount
+    for INSERT/UPDATE/DELETE, and copy_expert / execute_values for the bulk writes
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self.rows = []
+
+    def execute(self, query, params=None):
+        query, params = translate(query, params)
+        self.run(query, params)
+
+    def executemany(self, query, params_seq):
+        for params in params_seq:
+            self.execute(query, params)
+
+    def run(self, query, params=None):
+        self.connection.begin()
+        result = self.connection.duck.execute(query, params)
+        if DML_STATEMENT.match(query) and 'RETURNING' not in query.upper():
+            self.description = None
+            self.rows = []
+            self.rowcount = result.fetchone()[0]
+        elif result.description:
+            self.description = [Column(*column) for column in result.description]
+            self.rows = result.fetchall()
+            self.rowcount = len(self.rows)
+        else:
+            self.description = None
+            self.rows = []
+            self.rowcount = -1
+
+    def execute_values(self, query, rows, page_size=100):
+        """
+        psycopg2.extras.execute_values for the `VALUES %s` form: the rows are scanned from
+        a registered frame of Python objects (NULLs stay NULL) instead of bound one by one
+        """
+        if 'VALUES %s' not in query:
+            raise ValueError("execute_values on the embedded database supports 'VALUES %s' queries only.")
+        frame = pd.DataFrame(list(rows), dtype=object)
+        self.connection.duck.register('execute_values_rows', frame)
+        try:
+            self.run(rewrite(query).replace('VALUES %s', 'SELECT * FROM execute_values_rows').replace('%%', '%'))
+        finally:
+            self.connection.duck.unregister('execute_values_rows')
+
+    def copy_expert(self, query, file):
+        """
+        COPY ... FROM STDIN in Postgres' tab-separated text format (NULL as \\N)
+        """
+        match = COPY_STATEMENT.match(query)
+        if match is None:
+            raise ValueError(f"Invalid COPY statement '{query}' specified. Use COPY <table> (<columns>) FROM STDIN.")
+        table, columns = match.group(1), [column.strip() for column in match.group(2).split(',')]
+        text = file.read()
+        if not text:
+            return
+        frame = pd.read_csv(io.StringIO(text), sep='\t', header=None, names=columns, dtype=str,
+                            keep_default_na=False, na_values=['\\N'])
+        self.connection.duck.register('copy_rows', frame)
+        try:
+            self.run(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM copy_rows")
+        finally:
+            self.connection.duck.unregister('copy_rows')
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+class EmbeddedConnection:
+    """
+    psycopg2-like connection to the embedded database: statements run in an implicit
+    transaction until commit() or rollback() (unless autocommit is set), and
+    `with conn:` commits on success and rolls back on error without closing
+    """
+
+    def __init__(self, duck):
+        self.duck = duck
+        self.autocommit = False
+        self.closed = 0
+        self.in_transaction = False
+
+    def cursor(self):
+        return EmbeddedCursor(self)
+
+    def read_frame(self, query, params=None):
+        """
+        the query's result as a DataFrame, converted column by column rather than row by row
+        """
+        query, params = translate(query, params)
+        self.begin()
+        return self.duck.execute(query, params).df()
+
+    def begin(self):
+        if not self.autocommit and not self.in_transaction:
+            self.duck.execute("BEGIN TRANSACTION")
+            self.in_transaction = True
+
+    def commit(self):
+        if self.in_transaction:
+            self.in_transaction = False
+            self.duck.execute("COMMIT")
+
+    def rollback(self):
+        if self.in_transaction:
+            self.in_transaction = False
+            self.duck.execute("ROLLBACK")
+
+    def close(self):
+        if not self.closed:
+            self.rollback()
+            self.duck.close()
+            self.closed = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+# one DuckDB database per file per process (DuckDB lets a single process open a file for
+# writing); every connection is a cursor of it, with the session settings Postgres would have
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def open_database(path):
+    """
+    opens the database file, with in-process stand-ins for Postgres' advisory locks
+    (used by the refresh's single-flight lock), shared by every connection
+    """
+    database = duckdb.connect(path)
+    database.execute("CREATE SCHEMA IF NOT EXISTS public;")
+    held = set()
+
+    def try_advisory_lock(key):
+        with _databases_lock:
+            if key in held:
+                return False
+            held.add(key)
+            return True
+
+    def advisory_unlock(key):
+        with _databases_lock:
+            if key not in held:
+                return False
+            held.discard(key)
+            return True
+
+    database.create_function('pg_try_advisory_lock', try_advisory_lock, ['BIGINT'], 'BOOLEAN', side_effects=True)
+    database.create_function('pg_advisory_unlock', advisory_unlock, ['BIGINT'], 'BOOLEAN', side_effects=True)
+    return database
+
+
+def connect(path=DEFAULT_PATH):
+    """
+    open a psycopg2-like connection to the embedded DuckDB database at path
+    """
+    if duckdb is None:
+        raise ImportError("the embedded database needs duckdb: pip install duckdb")
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = open_database(path)
+        duck = _databases[path].cursor()
+
+    # tables live in the public schema, like Postgres, and timestamps are read in UTC
+    duck.execute("SET schema = 'public'; SET TimeZone = 'UTC';")
+    return EmbeddedConnection(duck)
+
+
+class EmbeddedPool:
+    """
+    connection pool over the embedded database, with ConnectionPool's interface:
+    blocks when every connection is borrowed and reuses returned connections
+    """
+
+    def __init__(self, path=DEFAULT_PATH, maxconn=5):
+        self.path = path
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def getconn(self):
+        self.slots.acquire()
+        try:
+            with self.lock:
+                if self.idle:
+                    return self.idle.pop()
+            return connect(self.path)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            if not conn.closed:
+                conn.rollback()
+                with self.lock:
+                    self.idle.append(conn)
+        finally:
+            self.slots.release()
+
+    def closeall(self):
+        with self.lock:
+            for conn in self.idle:
+                conn.close()
+            self.idle.clear()
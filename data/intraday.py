@@ -0,0 +1,193 @@
+import datetime as dt
+import os
+import sys
+import pandas as pd
+from .db import connection, execute_values
+from .sources import market_data
+from .rate_limit import TokenBucket, call_with_retries
+
+# bar sizes in minutes: 1-minute bars are ingested, coarser ones are rolled up from them
+BASE_MINUTES = 1
+RESAMPLE_MINUTES = (5, 15, 60, 1440)
+
+# resolution names used by the UI, mapped to bar minutes
+RESOLUTION_MINUTES = {'1m': 1, '5m': 5, '15m': 15, '1h': 60, '1d': 1440}
+
+# buckets are aligned to the exchange session: intraday buckets count from the 09:30 open,
+# daily ('1d') buckets start at midnight exchange time
+MARKET_TIMEZONE = 'America/New_York'
+SESSION_OPEN = pd.Timedelta(hours=9, minutes=30)
+MINUTES_PER_DAY = 1440
+
+# yfinance only serves 1-minute bars for the last few days
+MAX_LOOKBACK_DAYS = 7
+
+# columns written to intraday_bars, in insert order
+INTRADAY_COLUMNS = ('ticker', 'minutes', 'ts', 'open_price', 'high_price', 'low_price', 'close_price',
+                    'volume', 'last_ts')
+
+
+def bucket_start(index, minutes):
+    """
+    start (UTC) of the minutes-long bucket each timestamp of a UTC index falls in, in
+    exchange time: daily buckets from midnight, shorter ones counted from the session open
+    """
+    # wall-clock exchange time, so the open stays at 09:30 across DST changes
+    local = index.tz_convert(MARKET_TIMEZONE).tz_localize(None)
+    day = local.normalize()
+    if minutes >= MINUTES_PER_DAY:
+        start = day
+    else:
+        start = day + SESSION_OPEN + (local - day - SESSION_OPEN).floor(f"{minutes}min")
+    return start.tz_localize(MARKET_TIMEZONE).tz_convert('UTC')
+
+
+class BarResampler:
+    """
+    rolls 1-minute bars into coarser buckets as they arrive, without recomputing history.
+    for every (ticker, bar size) it keeps the newest bucket in memory; new 1-minute bars
+    extend that bucket or open new ones, and every touched bucket is returned for upsert.
+    bars at or before a bucket's last merged bar are ignored, so overlapping fetches are safe.
+    """
+
+    def __init__(self, minutes=RESAMPLE_MINUTES):
+        self.minutes = minutes
+        self.buckets = {}  # (ticker, minutes) -> dict(ts, open, high, low, close, volume, last_ts)
+
+    def seed(self, cursor, tickers):
+        """
+        restores the newest bucket per ticker and bar size from intraday_bars
+        """
+        cursor.execute("""
+            SELECT DISTINCT ON (ticker, minutes)
+                   ticker, minutes, ts, open_price, high_price, low_price, close_price, volume, last_ts
+            FROM intraday_bars
+            WHERE ticker = ANY(%s) AND minutes = ANY(%s)
+            ORDER BY ticker, minutes, ts DESC;
+        """, (list(tickers), list(self.minutes)))
+        for ticker, minutes, ts, open_, high, low, close, volume, last_ts in cursor.fetchall():
+            self.buckets[(ticker, minutes)] = dict(ts=ts, open=open_, high=high, low=low, close=close,
+                                                   volume=volume, last_ts=last_ts)
+
+    def update(self, ticker, bars):
+        """
+        merges new 1-minute bars (UTC index, OHLCV columns) and returns the touched
+        buckets as intraday_bars rows
+        """
+        rows = []
+        for minutes in self.minutes:
+            state = self.buckets.get((ticker, minutes))
+            new = bars if state is None else bars[bars.index > state['last_ts']]
+            if new.empty:
+                continue
+
+            # aggregate the batch per bucket in one vectorized pass
+            bucket = bucket_start(new.index, minutes)
+            grouped = new.groupby(bucket)
+            batch = pd.DataFrame({
+                'open': grouped['Open'].first(),
+                'high': grouped['High'].max(),
+                'low': grouped['Low'].min(),
+                'close': grouped['Close'].last(),
+                'volume': grouped['Volume'].sum(),
+                'last_ts': pd.Series(new.index, index=bucket).groupby(level=0).max(),
+            })
+
+            # the first bucket may continue the one already in progress
+            if state is not None and batch.index[0] == state['ts']:
+                first = batch.index[0]
+                batch.loc[first, 'open'] = state['open']
+                batch.loc[first, 'high'] = max(batch.loc[first, 'high'], state['high'])
+                batch.loc[first, 'low'] = min(batch.loc[first, 'low'], state['low'])
+                batch.loc[first, 'volume'] += state['volume']
+
+            rows.extend(zip(
+                [ticker] * len(batch), [minutes] * len(batch), batch.index.to_pydatetime(),
+                batch['open'].astype(float).tolist(), batch['high'].astype(float).tolist(),
+                batch['low'].astype(float).tolist(), batch['close'].astype(float).tolist(),
+                batch['volume'].astype('int64').tolist(), batch['last_ts'].dt.to_pydatetime()))
+            last = batch.iloc[-1]
+            self.buckets[(ticker, minutes)] = dict(ts=batch.index[-1], open=last['open'], high=last['high'],
+                                                   low=last['low'], close=last['close'],
+                                                   volume=last['volume'], last_ts=last['last_ts'])
+        return rows
+
+
+def base_rows(ticker, bars):
+    """
+    intraday_bars rows for the ingested 1-minute bars themselves
+    """
+    timestamps = bars.index.to_pydatetime()
+    return list(zip(
+        [ticker] * len(bars), [BASE_MINUTES] * len(bars), timestamps,
+        bars['Open'].astype(float).tolist(), bars['High'].astype(float).tolist(),
+        bars['Low'].astype(float).tolist(), bars['Close'].astype(float).tolist(),
+        bars['Volume'].fillna(0).astype('int64').tolist(), timestamps))
+
+
+def get_intraday_watermarks(cursor, tickers):
+    """
+    newest stored 1-minute bar per ticker, in one query
+    """
+    cursor.execute("""
+        SELECT ticker, MAX(ts) FROM intraday_bars
+        WHERE ticker = ANY(%s) AND minutes = %s GROUP BY ticker;
+    """, (list(tickers), BASE_MINUTES))
+    return dict(cursor.fetchall())
+
+
+def write_intraday(cursor, rows):
+    """
+    upserts intraday_bars rows; rolled-up buckets are overwritten with their latest aggregate
+    """
+    if not rows:
+        return
+    execute_values(cursor, f"""
+        INSERT INTO intraday_bars ({', '.join(INTRADAY_COLUMNS)})
+        VALUES %s
+        ON CONFLICT (ticker, minutes, ts) DO UPDATE SET
+            open_price = EXCLUDED.open_price,
+            high_price = EXCLUDED.high_price,
+            low_price = EXCLUDED.low_price,
+            close_price = EXCLUDED.close_price,
+            volume = EXCLUDED.volume,
+            last_ts = EXCLUDED.last_ts
+        """, rows, page_size=len(rows))
+
+
+def ingest_intraday(tickers, limiter=None):
+    """
+    fetches new 1-minute bars for the given tickers and streams them through the resampler,
+    one transaction per ticker
+    """
+    limiter = limiter or TokenBucket()
+    resampler = BarResampler()
+    with connection() as conn, conn.cursor() as cursor:
+        resampler.seed(cursor, tickers)
+        watermarks = get_intraday_watermarks(cursor, tickers)
+        conn.commit()
+
+        earliest = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=MAX_LOOKBACK_DAYS - 1)
+        for ticker in tickers:
+            start = max(watermarks.get(ticker, earliest), earliest)
+            stock = market_data().Ticker(ticker)
+            bars = call_with_retries(lambda: stock.history(start=start, interval='1m'), limiter)
+            bars.index = bars.index.tz_convert('UTC')
+            if ticker in watermarks:
+                bars = bars[bars.index > watermarks[ticker]]
+            if bars.empty:
+                print(f"⚠️ {ticker}: no new intraday bars.")
+                continue
+
+            rows = base_rows(ticker, bars) + resampler.update(ticker, bars)
+            with conn:
+                write_intraday(cursor, rows)
+            print(f"⏱️ {ticker}: {len(bars)} 1-minute bars ingested, {len(rows) - len(bars)} rolled-up buckets updated.")
+
+
+if __name__ == "__main__":
+    # tickers from the command line, else INTRADAY_TICKERS (comma separated)
+    tickers = sys.argv[1:] or [t for t in os.getenv('INTRADAY_TICKERS', '').split(',') if t]
+    if not tickers:
+        sys.exit("usage: python -m data.intraday TICKER [TICKER ...]  (or set INTRADAY_TICKERS)")
+    ingest_intraday(tickers)
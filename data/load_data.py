@@ -1,71 +1,140 @@
-import yfinance as yf
 import datetime as dt
 import pandas as pd
+import io
 import os
-import psycopg2
-from dotenv import load_dotenv
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pytz
+from .backfill import (compare_prices, detect_adjustment, price_frame, rebuild_features, record_backfill,
+                       stored_prices)
+from .db import connection, execute_values
+from . import metrics
+from .mirror import append_bars, replace_bars
+from .rate_limit import TokenBucket, call_with_retries
+from .sources import market_data
+from .thumbnails import cache_thumbnails
 
 
-def connect_to_db(env="prod"):
-    """
-    Connect to the PostgreSQL database.
-    Use 'env="dev"' for local db and 'env="prod"' for hosted db.
-    """
-    # load env variables
-    load_dotenv()
-
-    # decide which environment to use
-    if env == "dev":
-        # Local DB credentials
-        DB_NAME = os.getenv('DB_NAME')
-        DB_USER = os.getenv('DB_USER')
-        DB_PASSWORD = os.getenv('DB_PASSWORD')
-        DB_HOST = os.getenv('DB_HOST', 'localhost')
-        DB_PORT = os.getenv('DB_PORT', '5432')
-        # connect to local PostgreSQL
-        return psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT)
-    
-    elif env == "prod":
-        # Hosted DB credentials
-        DB_URL = os.getenv('POSTGRES_URL')  # Full connection URL for hosted DB
-        # connect to hosted PostgreSQL
-        return psycopg2.connect(DB_URL)
-    
-    else:
-        raise ValueError(f"Invalid environment '{env}' specified. Use 'dev' or 'prod'.")
+# days re-fetched before each watermark and upserted, so late corrections to recent bars
+# (including a last bar stored mid-session) replace the stored ones
+OVERLAP_DAYS = 5
+
+# tickers sharing a fetch start date are downloaded in one request once a group is this big
+GROUP_DOWNLOAD_MIN = 3
+
+
+def get_watermarks(cursor):
+    """
+    get the latest ingested date for every ticker in a single query
+    """
+    cursor.execute("SELECT ticker, last_date FROM ingest_watermark;")
+    return dict(cursor.fetchall())
 
 
-def get_last_ingested_date(ticker_symbol, cursor):
+def fetch_start(last_date):
     """
-    Get the latest date for which stock data has already been inserted for the given ticker.
+    first date to request for a ticker, or None to fetch its full history
+    """
+    if last_date is None:
+        return None
+    return (last_date - dt.timedelta(days=OVERLAP_DAYS)).date()
+
+
+def get_fetch_starts(cursor, tickers):
+    """
+    fetch start date (None for a full history) for each ticker, from one watermark query
+    """
+    watermarks = get_watermarks(cursor)
+    return {ticker_symbol: fetch_start(watermarks.get(ticker_symbol)) for ticker_symbol in tickers}
+
+
+def update_watermark(ticker_symbol, hist_data, cursor):
+    """
+    advances the ticker's watermark to the newest bar in hist_data
     """
     cursor.execute("""
-        SELECT MAX(date) FROM stocks WHERE ticker = %s;
-    """, (ticker_symbol,))
-    
-    result = cursor.fetchone()
-    return result[0] if result[0] else dt.datetime(1970, 1, 1)
+        INSERT INTO ingest_watermark (ticker, last_date, updated_at)
+        VALUES (%s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (ticker) DO UPDATE SET
+            last_date = GREATEST(ingest_watermark.last_date, EXCLUDED.last_date),
+            updated_at = EXCLUDED.updated_at
+    """, (ticker_symbol, hist_data.index.max().date()))
 
 
-def insert_stock_data(ticker_symbol, hist_data, cursor):
+# columns written to the stocks table, in insert order
+STOCK_COLUMNS = ('ticker', 'date', 'open_price', 'close_price', 'high_price', 'low_price', 'volume')
+
+# bulk write strategies for insert_stock_data: 'copy' streams rows into a temp
+# staging table and merges them, 'values' sends multi-row VALUES batches
+INSERT_METHODS = ('copy', 'values')
+
+
+def stock_rows(ticker_symbol, hist_data):
+    """
+    converts a yfinance history frame into stocks table row tuples
     """
-    inserts stock data into the stocks table for new dates only
+    return list(zip(
+        [ticker_symbol] * len(hist_data),
+        [date.date() for date in hist_data.index],
+        hist_data['Open'].astype(float).tolist(),
+        hist_data['Close'].astype(float).tolist(),
+        hist_data['High'].astype(float).tolist(),
+        hist_data['Low'].astype(float).tolist(),
+        hist_data['Volume'].fillna(0).astype('int64').tolist()))
+
+
+def insert_stock_data(ticker_symbol, hist_data, cursor, method='copy', overwrite=False):
     """
-    for date, row in hist_data.iterrows():
-        cursor.execute(
-            """
-            INSERT INTO stocks (ticker, date, open_price, close_price, high_price, low_price, volume)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (ticker, date) DO NOTHING
-            """, (ticker_symbol, date.date(),
-            float(row['Open']), float(row['Close']), float(row['High']),
-            float(row['Low']), float(row['Volume'])))
+    inserts stock data into the stocks table for new dates only (overwrite: stored
+    dates are updated with the given bars too). all rows are sent in one bulk
+    statement; the caller owns the transaction. returns the number of rows sent.
+    """
+    rows = stock_rows(ticker_symbol, hist_data)
+    if not rows:
+        return 0
+
+    if overwrite:
+        conflict = "ON CONFLICT (ticker, date) DO UPDATE SET " + ', '.join(
+            f"{column} = EXCLUDED.{column}" for column in STOCK_COLUMNS[2:])
+    else:
+        conflict = "ON CONFLICT (ticker, date) DO NOTHING"
+
+    if method == 'copy':
+        # stage the rows with COPY, then merge them in a single statement
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS stocks_staging (
+                ticker VARCHAR(10),
+                date TIMESTAMPTZ,
+                open_price DOUBLE PRECISION,
+                close_price DOUBLE PRECISION,
+                high_price DOUBLE PRECISION,
+                low_price DOUBLE PRECISION,
+                volume BIGINT
+            ) ON COMMIT DELETE ROWS
+        """)
+        cursor.execute("TRUNCATE stocks_staging")
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(str(value) for value in row) + '\n')
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY stocks_staging ({', '.join(STOCK_COLUMNS)}) FROM STDIN", buffer)
+        cursor.execute(f"""
+            INSERT INTO stocks ({', '.join(STOCK_COLUMNS)})
+            SELECT {', '.join(STOCK_COLUMNS)} FROM stocks_staging
+            {conflict}
+        """)
+    elif method == 'values':
+        # one multi-row VALUES statement for the whole history
+        execute_values(cursor, f"""
+            INSERT INTO stocks ({', '.join(STOCK_COLUMNS)})
+            VALUES %s
+            {conflict}
+            """, rows, page_size=len(rows))
+    else:
+        raise ValueError(f"Invalid insert method '{method}' specified. Use one of {INSERT_METHODS}.")
+
+    return len(rows)
 
 
 def insert_stock_metadata(ticker_symbol, metadata, cursor):
@@ -106,84 +175,460 @@ def insert_stock_metadata(ticker_symbol, metadata, cursor):
           metadata.get('timezone'), metadata.get('exchangeTimezoneName'), dt.datetime.now(pytz.timezone('US/Pacific'))))
 
 
-def insert_stock_news(ticker_symbol, news_data, cursor):
+def update_market_fields(ticker_symbol, cursor):
     """
-    inserts stock news into the stock_news table
+    refreshes the market fields of an existing lu_stock row from the stored bars and
+    stock_stats, for tickers whose history came from a grouped download and so have
+    no fresh history_metadata. the descriptive fields are kept as they are.
     """
-    # filter news data to only those that have ticker_symbol in relatedTickers
-    news_data = [article for article in news_data if ticker_symbol in article.get('relatedTickers', [])]
-    for article in news_data:
-        # extract the first thumbnail, if available
-        thumbnail_info = article.get('thumbnail', {}).get('resolutions', [{}])[0]
-        thumbnail_url = thumbnail_info.get('url', None)
-        thumbnail_width = thumbnail_info.get('width', None)
-        thumbnail_height = thumbnail_info.get('height', None)
+    cursor.execute("""
+        UPDATE lu_stock SET
+            regular_market_price = (SELECT close_price FROM stocks WHERE ticker = %(ticker)s ORDER BY date DESC LIMIT 1),
+            regular_market_day_high = (SELECT high_price FROM stocks WHERE ticker = %(ticker)s ORDER BY date DESC LIMIT 1),
+            regular_market_day_low = (SELECT low_price FROM stocks WHERE ticker = %(ticker)s ORDER BY date DESC LIMIT 1),
+            regular_market_volume = (SELECT volume FROM stocks WHERE ticker = %(ticker)s ORDER BY date DESC LIMIT 1),
+            chart_previous_close = (SELECT close_price FROM stocks WHERE ticker = %(ticker)s
+                                    ORDER BY date DESC LIMIT 1 OFFSET 1),
+            fifty_two_week_high = (SELECT high_52_week FROM stock_stats WHERE ticker = %(ticker)s),
+            fifty_two_week_low = (SELECT low_52_week FROM stock_stats WHERE ticker = %(ticker)s),
+            last_updated = %(now)s
+        WHERE ticker = %(ticker)s;
+    """, {'ticker': ticker_symbol, 'now': dt.datetime.now(pytz.timezone('US/Pacific'))})
+
 
-        # convert providerPublishTime UNIX timestamp to timestamp
-        provider_publish_time = dt.datetime.utcfromtimestamp(article['providerPublishTime']).strftime('%Y-%m-%d %H:%M:%S')
+# columns written to stock_news, in insert order
+NEWS_COLUMNS = ('ticker', 'uuid', 'title', 'publisher', 'link', 'provider_publish_time', 'type',
+                'thumbnail_url', 'thumbnail_width', 'thumbnail_height')
 
+
+def news_rows(news_by_ticker):
+    """
+    deduplicates the news feeds of several tickers by uuid. returns the article rows
+    (stored once, under the first ticker linked to them) and the (uuid, ticker,
+    provider_publish_time) links for every ticker in news_by_ticker the article mentions.
+    """
+    articles = {}
+    links = set()
+    for ticker_symbol, news_data in news_by_ticker.items():
+        for article in news_data or []:
+            # only keep articles that mention a ticker being refreshed
+            related = [ticker for ticker in article.get('relatedTickers', []) if ticker in news_by_ticker]
+            if ticker_symbol not in related:
+                continue
+
+            # convert providerPublishTime UNIX timestamp to timestamp
+            provider_publish_time = dt.datetime.fromtimestamp(article['providerPublishTime'], dt.timezone.utc)
+            links.update((article['uuid'], ticker, provider_publish_time) for ticker in related)
+            if article['uuid'] in articles:
+                continue
+
+            # extract the first thumbnail, if available
+            thumbnail_info = (article.get('thumbnail') or {}).get('resolutions', [{}])[0]
+            articles[article['uuid']] = (
+                related[0], article['uuid'], article['title'], article['publisher'], article['link'],
+                provider_publish_time, article['type'], thumbnail_info.get('url'),
+                thumbnail_info.get('width'), thumbnail_info.get('height'))
+    return list(articles.values()), sorted(links)
+
+
+def insert_stock_news(news_by_ticker, cursor):
+    """
+    bulk-inserts the news of one or more tickers ({ticker: articles}): each article is
+    written to stock_news once and linked to its tickers in stock_news_tickers.
+    returns the number of (deduplicated) articles seen.
+    """
+    articles, links = news_rows(news_by_ticker)
+    if not articles:
+        return 0
+    execute_values(cursor, f"""
+        INSERT INTO stock_news ({', '.join(NEWS_COLUMNS)})
+        VALUES %s
+        ON CONFLICT (uuid) DO NOTHING
+        """, articles, page_size=len(articles))
+    execute_values(cursor, """
+        INSERT INTO stock_news_tickers (uuid, ticker, provider_publish_time)
+        VALUES %s
+        ON CONFLICT (ticker, uuid) DO NOTHING
+        """, links, page_size=len(links))
+    return len(articles)
+
+
+# rollup periods kept in stock_rollups, mapped to their date_trunc unit
+ROLLUP_PERIODS = {'W': 'week', 'M': 'month'}
+
+
+def update_rollups(ticker_symbol, since_date, cursor):
+    """
+    recomputes the weekly/monthly rollup buckets touched by bars on or after since_date
+    """
+    for period, unit in ROLLUP_PERIODS.items():
         cursor.execute("""
-            INSERT INTO stock_news (ticker, date, uuid, title, publisher, link, provider_publish_time, type, thumbnail_url, thumbnail_width, thumbnail_height)
-            VALUES (%s, CURRENT_TIMESTAMP, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (uuid) DO NOTHING
-        """, (
-            ticker_symbol, article['uuid'], article['title'], article['publisher'], article['link'],
-            provider_publish_time, article['type'], thumbnail_url, thumbnail_width, thumbnail_height
-        ))
-
-
-def main():
-    # connect to the database
-    conn = connect_to_db()
-    conn.autocommit = True
-    cursor = conn.cursor()
-
-    # access the list of stocks
-    stocks = pd.read_csv('data/stocks.csv')['ticker'].tolist()
-
-    # fetch data for each stock
-    for ticker_symbol in stocks:
-        print(f"----- fetching data for {ticker_symbol} ... -----")
-        stock = yf.Ticker(ticker_symbol)
-        
-        # get the most recent date for which data is available in the database
-        last_date = get_last_ingested_date(ticker_symbol, cursor)
-        print(f"Last ingested date for {ticker_symbol}: {last_date}")
-
-        # fetch historical market data
-        hist = stock.history(period='max')
-        # filter data to only include new dates
-        hist = hist[hist.index >= last_date]
-        # hist.index = hist.index.tz_convert('UTC')
-
-        if not hist.empty:
-            # insert stock data
-            insert_stock_data(ticker_symbol, hist, cursor)
-            print("📈 stock data inserted successfully.")
+            INSERT INTO stock_rollups (ticker, period, period_start, open_price, close_price, high_price, low_price, volume)
+            SELECT ticker, %(period)s, date_trunc(%(unit)s, date)::date,
+                   (array_agg(open_price ORDER BY date))[1],
+                   (array_agg(close_price ORDER BY date DESC))[1],
+                   MAX(high_price), MIN(low_price), SUM(volume)
+            FROM stocks
+            WHERE ticker = %(ticker)s AND date >= date_trunc(%(unit)s, %(since)s::timestamptz)
+            GROUP BY ticker, date_trunc(%(unit)s, date)
+            ON CONFLICT (ticker, period, period_start) DO UPDATE SET
+                open_price = EXCLUDED.open_price,
+                close_price = EXCLUDED.close_price,
+                high_price = EXCLUDED.high_price,
+                low_price = EXCLUDED.low_price,
+                volume = EXCLUDED.volume
+        """, {'ticker': ticker_symbol, 'period': period, 'unit': unit, 'since': since_date})
+
+
+# look-back windows in days summarised in stock_stats, keyed like the UI time frames
+STAT_WINDOWS = {'1w': 7, '1m': 30, '6m': 183, '1y': 365, '5y': 1825, 'max': 45545}
+
+
+def refresh_stock_stats(cursor, ticker_symbol=None):
+    """
+    recomputes the stock_stats summary row for one ticker (or every ticker when None)
+    from its latest bars; every value is an index range scan on stocks
+    """
+    start_columns = [f'start_price_{window}' for window in STAT_WINDOWS]
+    change_columns = [f'change_{window}' for window in STAT_WINDOWS]
+    columns = (['last_date', 'last_close', 'high_52_week', 'low_52_week', 'avg_volume_30_day']
+               + start_columns + change_columns + ['updated_at'])
+
+    # first open inside each window, and the change from it to the last close in percent
+    start_prices = ',\n'.join(
+        f"(SELECT open_price FROM stocks WHERE ticker = t.ticker AND date >= CURRENT_DATE - {days} "
+        f"ORDER BY date LIMIT 1) AS start_price_{window}"
+        for window, days in STAT_WINDOWS.items())
+    changes = ', '.join(
+        f"(last_close - start_price_{window}) / NULLIF(start_price_{window}, 0) * 100"
+        for window in STAT_WINDOWS)
+
+    cursor.execute(f"""
+        INSERT INTO stock_stats (ticker, {', '.join(columns)})
+        SELECT ticker, last_date, last_close, high_52_week, low_52_week, avg_volume_30_day,
+               {', '.join(start_columns)}, {changes}, CURRENT_TIMESTAMP
+        FROM (
+            SELECT t.ticker,
+                   (SELECT date::date FROM stocks WHERE ticker = t.ticker ORDER BY date DESC LIMIT 1) AS last_date,
+                   (SELECT close_price FROM stocks WHERE ticker = t.ticker ORDER BY date DESC LIMIT 1) AS last_close,
+                   (SELECT MAX(close_price) FROM stocks WHERE ticker = t.ticker AND date >= CURRENT_DATE - 365) AS high_52_week,
+                   (SELECT MIN(close_price) FROM stocks WHERE ticker = t.ticker AND date >= CURRENT_DATE - 365) AS low_52_week,
+                   (SELECT AVG(volume) FROM stocks WHERE ticker = t.ticker AND date >= CURRENT_DATE - 30) AS avg_volume_30_day,
+                   {start_prices}
+            FROM ingest_watermark t
+            WHERE %(ticker)s IS NULL OR t.ticker = %(ticker)s
+        ) AS latest
+        ON CONFLICT (ticker) DO UPDATE SET
+            {', '.join(f'{column} = EXCLUDED.{column}' for column in columns)}
+    """, {'ticker': ticker_symbol})
+
+
+def fetch_history(ticker_symbol, start, limiter, stock=None):
+    """
+    fetches price history for one ticker from start onwards (full history if start is None).
+    pass the ticker's stock object when its history_metadata is read afterwards.
+    """
+    stock = stock or market_data().Ticker(ticker_symbol)
+    with metrics.timer('ingest_stage_seconds', stage='history'):
+        if start is None:
+            return call_with_retries(lambda: stock.history(period='max'), limiter)
+        return call_with_retries(lambda: stock.history(start=start), limiter)
+
+
+def fetch_group_history(tickers, start, limiter):
+    """
+    fetches price history for several tickers sharing a start date in one request.
+    returns a dict of ticker -> history frame shaped like Ticker.history().
+    """
+    with metrics.timer('ingest_stage_seconds', stage='group_download'):
+        data = call_with_retries(lambda: market_data().download(
+            tickers, start=start, group_by='ticker', auto_adjust=True, actions=True,
+            threads=False, progress=False), limiter)
+    return {ticker_symbol: data[ticker_symbol].dropna(how='all') for ticker_symbol in tickers}
+
+
+def group_by_start(starts):
+    """
+    groups tickers by fetch start date; returns (groups to download together, tickers to fetch alone)
+    """
+    groups = {}
+    for ticker_symbol, start in starts.items():
+        groups.setdefault(start, []).append(ticker_symbol)
+
+    grouped, single = {}, []
+    for start, tickers in groups.items():
+        if start is not None and len(tickers) >= GROUP_DOWNLOAD_MIN:
+            grouped[start] = tickers
         else:
-            print("⚠️ no new data to insert.")
+            single.extend(tickers)
+    return grouped, single
+
+
+def fetch_ticker(ticker_symbol, start, limiter, hist=None):
+    """
+    fetches new price history, metadata and news for one ticker from the market data source.
+    hist can be passed in when it was already downloaded as part of a group; metadata
+    is then None (it would cost a history() call per ticker) and write_ticker refreshes
+    the market fields from the stored bars instead.
+    every API call goes through the shared rate limiter.
+    """
+    stock = market_data().Ticker(ticker_symbol)
+
+    # fetch historical market data from the watermark onwards, and the metadata that comes with it
+    metadata = None
+    if hist is None:
+        hist = fetch_history(ticker_symbol, start, limiter, stock)
+        with metrics.timer('ingest_stage_seconds', stage='metadata'):
+            metadata = call_with_retries(lambda: stock.history_metadata, limiter) # requires history() to be called first
+
+    # fetch stock news data
+    with metrics.timer('ingest_stage_seconds', stage='news'):
+        news = call_with_retries(lambda: stock.news, limiter)
+
+    return hist, metadata, news
 
-        # fetch stock metadata
-        metadata = stock.history_metadata # requires history() to be called first
+
+def reconcile_history(ticker_symbol, hist, start, conn, cursor, limiter):
+    """
+    checks incrementally fetched bars against the stored ones. when yfinance has
+    re-adjusted the ticker's earlier history (a split, a dividend, or overlap bars
+    that no longer match) its full history is fetched again for a backfill.
+    returns the bars to write and the adjustment, (reason, action date) or None.
+    """
+    if start is None or hist.empty:
+        return hist, None
+    # a read-only check, but in its own transaction so a database error rolls back
+    # instead of leaving the shared connection aborted for the next tickers
+    with conn:
+        adjustment = detect_adjustment(cursor, ticker_symbol, hist)
+    if adjustment is None:
+        return hist, None
+
+    reason, action_date = adjustment
+    print(f"🔁 {ticker_symbol}: {reason} detected on {action_date}; refetching its full history.")
+    return fetch_history(ticker_symbol, None, limiter), adjustment
+
+
+def backfill_ticker(ticker_symbol, hist, adjustment, conn, cursor, insert_method='copy'):
+    """
+    writes a re-adjusted full history: only bars that are new or whose prices changed
+    are sent, in one bulk upsert, then the rollups, stats and features built from the
+    rewritten range are rebuilt and the rewrite is recorded in backfill_audit.
+    the caller owns the transaction. returns the number of rows sent.
+    """
+    reason, action_date = adjustment
+    fetched = price_frame(hist)
+    missing, changed, max_price_diff = compare_prices(fetched, stored_prices(cursor, ticker_symbol))
+    target = hist[(missing | changed).to_numpy()]
+    if target.empty:
+        print(f"⚠️ {ticker_symbol}: refetched history matches the stored bars; nothing to backfill.")
+        return 0
+
+    row_count = insert_stock_data(ticker_symbol, target, cursor, method=insert_method, overwrite=True)
+    update_watermark(ticker_symbol, target, cursor)
+    with metrics.timer('ingest_stage_seconds', stage='rollups'):
+        update_rollups(ticker_symbol, target.index.min().date(), cursor)
+    with metrics.timer('ingest_stage_seconds', stage='stats'):
+        refresh_stock_stats(cursor, ticker_symbol)
+    with metrics.timer('ingest_stage_seconds', stage='features'):
+        rebuild_features(conn, cursor, ticker_symbol)
+
+    rewritten_dates = list(fetched.index[changed.to_numpy()])
+    record_backfill(cursor, ticker_symbol, reason, action_date, rewritten_dates, row_count, max_price_diff)
+    metrics.inc('ingest_backfills_total', reason=reason)
+    metrics.inc('ingest_backfill_rows_total', row_count)
+    print(f"🔁 {ticker_symbol}: {len(rewritten_dates)} re-adjusted bars rewritten "
+          f"({min(rewritten_dates, default='-')} to {max(rewritten_dates, default='-')}), "
+          f"{row_count - len(rewritten_dates)} new bars inserted.")
+    return row_count
+
+
+def write_ticker(ticker_symbol, hist, metadata, news, conn, cursor, insert_method, full_history=False,
+                 adjustment=None):
+    """
+    writes everything fetched for one ticker in a single transaction, then
+    appends the new bars to the local mirror (full_history: hist is the ticker's whole history).
+    with an adjustment from reconcile_history, hist is backfilled over the stored bars instead.
+    news may be None when the caller writes it in bulk for several tickers.
+    """
+    with conn:
+        if adjustment is not None:
+            with metrics.timer('ingest_stage_seconds', stage='backfill'):
+                backfill_ticker(ticker_symbol, hist, adjustment, conn, cursor, insert_method)
+        elif not hist.empty:
+            # insert stock data; the re-fetched overlap window overwrites the stored bars
+            start = time.perf_counter()
+            row_count = insert_stock_data(ticker_symbol, hist, cursor, method=insert_method, overwrite=True)
+            elapsed = time.perf_counter() - start
+            metrics.observe('ingest_stage_seconds', elapsed, stage='insert_stocks')
+            metrics.inc('ingest_rows_total', row_count, method=insert_method)
+            print(f"📈 {ticker_symbol}: {row_count} rows of stock data inserted in {elapsed:.2f}s "
+                  f"({row_count / max(elapsed, 1e-9):,.0f} rows/s, {insert_method}).")
+            update_watermark(ticker_symbol, hist, cursor)
+            with metrics.timer('ingest_stage_seconds', stage='rollups'):
+                update_rollups(ticker_symbol, hist.index.min().date(), cursor)
+            with metrics.timer('ingest_stage_seconds', stage='stats'):
+                refresh_stock_stats(cursor, ticker_symbol)
+        else:
+            print(f"⚠️ {ticker_symbol}: no new data to insert.")
 
         # insert stock metadata into lu_stock table
         if metadata:
-            insert_stock_metadata(ticker_symbol, metadata, cursor)
-            print("ℹ️ metadata inserted successfully.")
-        
-        # fetch stock news data
-        news = stock.news
+            with metrics.timer('ingest_stage_seconds', stage='insert_metadata'):
+                insert_stock_metadata(ticker_symbol, metadata, cursor)
+            print(f"ℹ️ {ticker_symbol}: metadata inserted successfully.")
+        else:
+            with metrics.timer('ingest_stage_seconds', stage='insert_metadata'):
+                update_market_fields(ticker_symbol, cursor)
+            print(f"ℹ️ {ticker_symbol}: market fields updated from the stored bars.")
 
         # insert stock news data into stock_news table
         if news:
-            insert_stock_news(ticker_symbol, news, cursor)
-            print("📰 news data inserted successfully.")
-        
-        print(f"✅ all data for {ticker_symbol} fetched successfully.")
-     
-    # close the connection
-    cursor.close()
-    conn.close()
+            with metrics.timer('ingest_stage_seconds', stage='insert_news'):
+                insert_stock_news({ticker_symbol: news}, cursor)
+            print(f"📰 {ticker_symbol}: news data inserted successfully.")
+
+    # the mirror and thumbnail cache are only written once Postgres has committed
+    if adjustment is not None:
+        with metrics.timer('ingest_stage_seconds', stage='mirror'):
+            replace_bars(ticker_symbol, stock_rows(ticker_symbol, hist))
+    elif not hist.empty:
+        with metrics.timer('ingest_stage_seconds', stage='mirror'):
+            append_bars(ticker_symbol, stock_rows(ticker_symbol, hist), create=full_history)
+    if news:
+        with metrics.timer('ingest_stage_seconds', stage='thumbnails'):
+            cache_thumbnails({ticker_symbol: news})
+
+
+def ingest_ticker(ticker_symbol, start, insert_method='copy', limiter=None):
+    """
+    fetches and writes a single ticker on a pooled connection, raising on failure.
+    used where each ticker is its own unit of work (e.g. one Airflow mapped task).
+    returns the number of bars fetched.
+    """
+    limiter = limiter or TokenBucket()
+    hist, metadata, news = fetch_ticker(ticker_symbol, start, limiter)
+    with connection() as conn, conn.cursor() as cursor:
+        hist, adjustment = reconcile_history(ticker_symbol, hist, start, conn, cursor, limiter)
+        write_ticker(ticker_symbol, hist, metadata, news, conn, cursor, insert_method,
+                     full_history=start is None, adjustment=adjustment)
+    return len(hist)
+
+
+# advisory lock key held by whichever process is refreshing, so refreshes are single-flight
+REFRESH_LOCK_ID = 5_120_771
+
+
+def load_tickers():
+    """
+    the tickers in data/stocks.csv
+    """
+    return pd.read_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stocks.csv'))['ticker'].tolist()
+
+
+def main(insert_method=None, max_workers=None, rate=None, tickers=None, on_progress=None):
+    """
+    refreshes price history, metadata and news for the given tickers (default: every
+    ticker in data/stocks.csv). tickers are fetched in parallel by a bounded worker pool
+    sharing one rate limiter; database writes happen on the calling thread, one
+    transaction per ticker. on_progress(ticker, ok) is called as each ticker finishes.
+    returns False without doing anything if another refresh is already running.
+    """
+    # pick the bulk write strategy ('copy' unless INSERT_METHOD says otherwise)
+    insert_method = insert_method or os.getenv('INSERT_METHOD', 'copy')
+    if insert_method not in INSERT_METHODS:
+        raise ValueError(f"Invalid insert method '{insert_method}' specified. Use one of {INSERT_METHODS}.")
+
+    # concurrency and request rate for the yfinance calls
+    max_workers = int(max_workers or os.getenv('INGEST_WORKERS', 8))
+    rate = float(rate or os.getenv('INGEST_RATE', 5))
+    limiter = TokenBucket(rate=rate, capacity=max_workers)
+
+    # borrow a connection from the shared pool
+    with connection() as conn, conn.cursor() as cursor:
+        # only one refresh at a time across every process using this database
+        cursor.execute("SELECT pg_try_advisory_lock(%s);", (REFRESH_LOCK_ID,))
+        if not cursor.fetchone()[0]:
+            print("⏳ another refresh is already running; skipping.")
+            return False
+        try:
+            refresh_tickers(conn, cursor, tickers or load_tickers(), insert_method, max_workers, limiter,
+                            on_progress)
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s);", (REFRESH_LOCK_ID,))
+            metrics.flush()
+    return True
+
+
+def refresh_tickers(conn, cursor, stocks, insert_method, max_workers, limiter, on_progress=None):
+    """
+    fetches and writes the given tickers using the given connection. news is gathered
+    for every ticker and written once at the end, so shared articles are stored once.
+    """
+    # read every ticker's watermark once and work out where each fetch starts
+    starts = get_fetch_starts(cursor, stocks)
+    conn.commit()
+    grouped, single = group_by_start(starts)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        print(f"----- fetching data for {len(stocks)} tickers with {max_workers} workers ... -----")
+        futures = {}
+        news_by_ticker = {ticker_symbol: [] for ticker_symbol in stocks}
+
+        # tickers sharing a watermark get their history in one grouped download
+        group_futures = {
+            executor.submit(fetch_group_history, tickers, group_start, limiter): tickers
+            for group_start, tickers in grouped.items()
+        }
+        for ticker_symbol in single:
+            futures[executor.submit(fetch_ticker, ticker_symbol, starts[ticker_symbol], limiter)] = ticker_symbol
+
+        for group_future in as_completed(group_futures):
+            tickers = group_futures[group_future]
+            try:
+                histories = group_future.result()
+            except Exception as e:
+                # fall back to fetching the group's tickers one by one
+                print(f"⚠️ grouped download failed for {len(tickers)} tickers: {e}")
+                histories = {}
+            for ticker_symbol in tickers:
+                future = executor.submit(fetch_ticker, ticker_symbol, starts[ticker_symbol], limiter,
+                                         histories.get(ticker_symbol))
+                futures[future] = ticker_symbol
+
+        # write each ticker as soon as its fetch completes
+        for future in as_completed(futures):
+            ticker_symbol = futures[future]
+            try:
+                hist, metadata, news_by_ticker[ticker_symbol] = future.result()
+                hist, adjustment = reconcile_history(ticker_symbol, hist, starts[ticker_symbol], conn, cursor,
+                                                     limiter)
+                write_ticker(ticker_symbol, hist, metadata, None, conn, cursor, insert_method,
+                             full_history=starts[ticker_symbol] is None, adjustment=adjustment)
+            except Exception as e:
+                print(f"❌ failed to refresh {ticker_symbol}: {e}")
+                metrics.inc('ingest_tickers_total', status='failed')
+                if on_progress:
+                    on_progress(ticker_symbol, False)
+                continue
+            print(f"✅ all data for {ticker_symbol} fetched successfully.")
+            metrics.inc('ingest_tickers_total', status='ok')
+            if on_progress:
+                on_progress(ticker_symbol, True)
+
+    # write every ticker's news in one transaction
+    with conn, metrics.timer('ingest_stage_seconds', stage='insert_news'):
+        article_count = insert_stock_news(news_by_ticker, cursor)
+    metrics.inc('ingest_news_articles_total', article_count)
+    print(f"📰 {article_count} unique news articles written for {len(stocks)} tickers.")
+    with metrics.timer('ingest_stage_seconds', stage='thumbnails'):
+        thumbnail_count = cache_thumbnails(news_by_ticker, max_workers)
+    print(f"🖼️ {thumbnail_count} new thumbnails cached.")
+
+    elapsed = time.perf_counter() - start
+    metrics.observe('ingest_refresh_seconds', elapsed)
+    print(f"----- refreshed {len(stocks)} tickers in {elapsed:.1f}s -----")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
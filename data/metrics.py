@@ -0,0 +1,172 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# METRICS=prometheus writes a Prometheus text-format snapshot to METRICS_PATH on flush(),
+# METRICS=jsonl appends every observation to METRICS_PATH as one JSON line.
+# METRICS_DEBUG_PANEL=1 keeps per-rerun timings for the Streamlit debug panel.
+# with neither set, timers and counters are no-ops.
+METRICS_FORMATS = ('prometheus', 'jsonl')
+METRICS_FORMAT = os.getenv('METRICS', '').lower() or None
+METRICS_PATH = os.getenv('METRICS_PATH') or {'prometheus': 'metrics.prom', 'jsonl': 'metrics.jsonl'}.get(METRICS_FORMAT)
+DEBUG_PANEL = os.getenv('METRICS_DEBUG_PANEL', '0') == '1'
+
+if METRICS_FORMAT is not None and METRICS_FORMAT not in METRICS_FORMATS:
+    raise ValueError(f"Invalid metrics format '{METRICS_FORMAT}' specified. Use one of {METRICS_FORMATS}.")
+
+ENABLED = METRICS_FORMAT is not None or DEBUG_PANEL
+
+# one shared do-nothing context manager, returned by timer() when metrics are off
+_NOOP = nullcontext()
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_timings = {}   # (name, labels) -> [count, total seconds, max seconds]
+_capture = threading.local()
+
+
+def enabled():
+    return ENABLED
+
+
+def debug_panel_enabled():
+    return DEBUG_PANEL
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _record(event):
+    """
+    hands one observation to the JSON-lines file and the current rerun's capture, if any
+    """
+    if METRICS_FORMAT == 'jsonl':
+        line = json.dumps({'ts': time.time(), **event}, default=str)
+        with _lock, open(METRICS_PATH, 'a') as file:
+            file.write(line + '\n')
+    events = getattr(_capture, 'events', None)
+    if events is not None:
+        events.append(event)
+
+
+def inc(name, value=1, **labels):
+    """
+    adds value to a counter
+    """
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _record({'type': 'counter', 'name': name, 'value': value, **labels})
+
+
+def observe(name, seconds, **labels):
+    """
+    records one duration
+    """
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        timing = _timings.setdefault(key, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+    _record({'type': 'timer', 'name': name, 'seconds': seconds, **labels})
+
+
+@contextmanager
+def _timer(name, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timer(name, **labels):
+    """
+    context manager timing its block into name{labels}; a shared no-op when metrics are off
+    """
+    if not ENABLED:
+        return _NOOP
+    return _timer(name, labels)
+
+
+def timed(name, **labels):
+    """
+    decorator timing every call of a function; returns the function untouched when metrics are off
+    """
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _timer(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_capture():
+    """
+    starts collecting this thread's observations (e.g. one Streamlit rerun)
+    """
+    if ENABLED:
+        _capture.events = []
+
+
+def stop_capture():
+    """
+    stops collecting and returns the observations since start_capture()
+    """
+    events = getattr(_capture, 'events', None) or []
+    _capture.events = None
+    return events
+
+
+def _labels_text(labels):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}' if labels else ''
+
+
+def prometheus_text():
+    """
+    every counter and timer in Prometheus text exposition format
+    """
+    with _lock:
+        counters = dict(_counters)
+        timings = {key: list(value) for key, value in _timings.items()}
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(f"{name}{_labels_text(labels)} {value}"
+                     for (counter, labels), value in sorted(counters.items()) if counter == name)
+    for name in sorted({name for name, _ in timings}):
+        lines.append(f"# TYPE {name} summary")
+        for (timing, labels), (count, total, longest) in sorted(timings.items()):
+            if timing == name:
+                lines.append(f"{name}_count{_labels_text(labels)} {count}")
+                lines.append(f"{name}_sum{_labels_text(labels)} {total:.6f}")
+        lines.append(f"# TYPE {name}_max gauge")
+        lines.extend(f"{name}_max{_labels_text(labels)} {longest:.6f}"
+                     for (timing, labels), (count, total, longest) in sorted(timings.items()) if timing == name)
+    return '\n'.join(lines) + '\n'
+
+
+def flush():
+    """
+    writes the Prometheus snapshot (atomically, for a node exporter textfile collector);
+    JSON lines are written as they happen. safe to call from concurrent Streamlit sessions.
+    """
+    if METRICS_FORMAT != 'prometheus':
+        return
+    tmp_path = f"{METRICS_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(prometheus_text())
+    os.replace(tmp_path, METRICS_PATH)
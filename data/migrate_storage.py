@@ -0,0 +1,141 @@
+import json
+import sys
+from .db import connect_to_db
+from .create_db import FIRST_PARTITION_YEAR, STOCKS_TABLE_QUERIES, create_stock_partitions
+
+# columns copied from the heap table into the partitioned layout
+MIGRATED_COLUMNS = ('ticker', 'date', 'open_price', 'close_price', 'high_price', 'low_price', 'volume')
+
+# hot queries that should be answered from indexes alone, with a sample ticker bound in
+HOT_QUERIES = {
+    'chart (1y, newest first)': """
+        SELECT date, open_price, close_price FROM stocks
+        WHERE ticker = %(ticker)s AND date >= CURRENT_DATE - 365 ORDER BY date DESC
+    """,
+    'latest bar': """
+        SELECT MAX(date) FROM stocks WHERE ticker = %(ticker)s
+    """,
+    '52-week range': """
+        SELECT MAX(close_price), MIN(close_price) FROM stocks
+        WHERE ticker = %(ticker)s AND date >= CURRENT_DATE - 365
+    """,
+}
+
+
+def is_partitioned(cursor):
+    """
+    check whether the stocks table already uses the partitioned layout
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'stocks' AND relkind IN ('r', 'p');")
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def migrate(drop_heap=False):
+    """
+    converts an existing heap stocks table into the partitioned layout in place.
+    runs in one transaction: the old table is renamed to stocks_heap, the new
+    layout is created under the original name and every row is copied across.
+    """
+    conn = connect_to_db()
+    try:
+        with conn, conn.cursor() as cursor:
+            if is_partitioned(cursor):
+                print("stocks is already partitioned; nothing to migrate.")
+                return
+
+            # block writers for the duration of the copy
+            cursor.execute("LOCK TABLE stocks IN EXCLUSIVE MODE;")
+            cursor.execute("SELECT EXTRACT(YEAR FROM MIN(date))::int FROM stocks;")
+            first_year = cursor.fetchone()[0]
+
+            # move the heap table (and its index names) out of the way
+            cursor.execute("ALTER TABLE stocks RENAME TO stocks_heap;")
+            cursor.execute("ALTER INDEX IF EXISTS stocks_pkey RENAME TO stocks_heap_pkey;")
+            cursor.execute("ALTER INDEX IF EXISTS stocks_ticker_date_key RENAME TO stocks_heap_ticker_date_key;")
+
+            # create the partitioned layout and copy the rows across
+            for query in STOCKS_TABLE_QUERIES['partitioned']:
+                cursor.execute(query)
+            create_stock_partitions(cursor, first_year=min(first_year or FIRST_PARTITION_YEAR, FIRST_PARTITION_YEAR))
+            cursor.execute(f"""
+                INSERT INTO stocks ({', '.join(MIGRATED_COLUMNS)})
+                SELECT {', '.join(MIGRATED_COLUMNS)} FROM stocks_heap;
+            """)
+            print(f"📦 copied {cursor.rowcount} rows into the partitioned stocks table.")
+
+            if drop_heap:
+                cursor.execute("DROP TABLE stocks_heap;")
+                print("🗑️ dropped the old heap table.")
+            else:
+                print("ℹ️ the old table is kept as stocks_heap; drop it once the migration is verified.")
+
+        # refresh the visibility map and statistics so index-only scans are chosen
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE stocks;")
+        print("✅ stocks migrated to the partitioned layout.")
+    finally:
+        conn.close()
+
+
+def plan_nodes(plan):
+    """
+    yields every node of an EXPLAIN (FORMAT JSON) plan tree
+    """
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def check_plans(ticker=None):
+    """
+    EXPLAINs the hot queries and reports whether each one reads stocks through
+    index-only scans only. returns True when every query passes.
+    """
+    conn = connect_to_db()
+    try:
+        with conn, conn.cursor() as cursor:
+            if ticker is None:
+                cursor.execute("SELECT ticker FROM ingest_watermark ORDER BY last_date DESC LIMIT 1;")
+                row = cursor.fetchone()
+                ticker = row[0] if row else 'MSFT'
+
+            # empty partitions (e.g. future years) are always seq scanned at zero cost; ignore them.
+            # only partitions: a heap stocks table that was never vacuumed also has relpages = 0
+            cursor.execute("""
+                SELECT relname FROM pg_class
+                WHERE relname LIKE 'stocks%%' AND relkind = 'r' AND relispartition AND relpages = 0;
+            """)
+            empty = {row[0] for row in cursor.fetchall()}
+
+            passed = True
+            for name, query in HOT_QUERIES.items():
+                cursor.execute("EXPLAIN (FORMAT JSON) " + query, {'ticker': ticker})
+                plan = cursor.fetchone()[0][0]['Plan']
+                scans = [node['Node Type'] for node in plan_nodes(plan)
+                         if node.get('Relation Name', '').startswith('stocks')
+                         and node['Relation Name'] not in empty]
+                ok = bool(scans) and all(scan == 'Index Only Scan' for scan in scans)
+                passed = passed and ok
+                print(f"{'✅' if ok else '❌'} {name}: {', '.join(sorted(set(scans))) or 'no scan of stocks'}")
+                if not ok:
+                    print(json.dumps(plan, indent=2))
+            return passed
+    finally:
+        conn.close()
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    if command == 'migrate':
+        migrate(drop_heap='--drop-heap' in sys.argv)
+    elif command == 'check':
+        sys.exit(0 if check_plans(sys.argv[2] if len(sys.argv) > 2 else None) else 1)
+    else:
+        print("usage: python -m data.migrate_storage [migrate [--drop-heap] | check [TICKER]]")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
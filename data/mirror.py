@@ -0,0 +1,146 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from .db import connection
+
+# pyarrow is optional; without it the mirror is simply disabled
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+# one Arrow IPC file of daily bars per ticker, sorted by date; next to this module
+# unless LOCAL_MIRROR_DIR says otherwise, whatever directory the app or ingest runs from
+MIRROR_DIR = os.path.abspath(os.getenv('LOCAL_MIRROR_DIR')
+                             or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mirror'))
+
+# columns stored in the mirror, same names as the stocks table
+MIRROR_COLUMNS = ('date', 'open_price', 'close_price', 'high_price', 'low_price', 'volume')
+
+if pa is not None:
+    MIRROR_SCHEMA = pa.schema([
+        ('date', pa.date32()),
+        ('open_price', pa.float64()),
+        ('close_price', pa.float64()),
+        ('high_price', pa.float64()),
+        ('low_price', pa.float64()),
+        ('volume', pa.int64()),
+    ])
+
+
+def mirror_enabled():
+    """
+    the mirror is used when pyarrow is installed and LOCAL_MIRROR=1
+    """
+    return pa is not None and os.getenv('LOCAL_MIRROR', '0') == '1'
+
+
+def mirror_path(ticker):
+    return os.path.join(MIRROR_DIR, f"{ticker}.arrow")
+
+
+def read_mirror(ticker):
+    """
+    memory-maps the ticker's mirror file; returns an Arrow table or None if there is none
+    """
+    path = mirror_path(ticker)
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path, 'r') as source:
+        return ipc.open_file(source).read_all()
+
+
+def write_mirror(ticker, table):
+    """
+    atomically replaces the ticker's mirror file so concurrent readers never see a partial file
+    """
+    os.makedirs(MIRROR_DIR, exist_ok=True)
+    path = mirror_path(ticker)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink, ipc.new_file(sink, MIRROR_SCHEMA) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def rows_to_table(rows):
+    """
+    converts stocks table row tuples (ticker first, as built by load_data.stock_rows) to an Arrow table
+    """
+    columns = [list(column) for column in zip(*rows)][1:] if rows else [[] for _ in MIRROR_COLUMNS]
+    return pa.table(dict(zip(MIRROR_COLUMNS, columns)), schema=MIRROR_SCHEMA)
+
+
+def append_bars(ticker, rows, create=False):
+    """
+    merges recent bars into the mirror: mirrored bars from the first given date on are
+    replaced by rows (like the upsert of the overlap window). a ticker without a mirror
+    file is only created when create is True (rows hold its full history); otherwise it
+    is left for `python -m data.mirror [TICKER...]` so the mirror never has gaps.
+    """
+    if not mirror_enabled() or not rows:
+        return
+    existing = read_mirror(ticker)
+    if existing is None and not create:
+        return
+
+    new = rows_to_table(sorted(rows, key=lambda row: row[1]))
+    if existing is not None and existing.num_rows:
+        first_date = new['date'][0].as_py()
+        kept = existing.filter(pc.less(existing['date'], pa.scalar(first_date, pa.date32())))
+        new = pa.concat_tables([kept, new])
+    write_mirror(ticker, new)
+
+
+def replace_bars(ticker, rows):
+    """
+    rewrites the ticker's mirror file from rows holding its full history, e.g. after
+    earlier bars were re-adjusted
+    """
+    if not mirror_enabled() or not rows:
+        return
+    write_mirror(ticker, rows_to_table(sorted(rows, key=lambda row: row[1])))
+
+
+def fetch_price_history(ticker, start_date=None, columns=MIRROR_COLUMNS):
+    """
+    price bars for one ticker from the mirror, shaped like queries.fetch_price_history
+    (newest first, requested columns only); returns None when the ticker isn't mirrored
+    """
+    table = read_mirror(ticker)
+    if table is None:
+        return None
+    if start_date is not None:
+        # dates are sorted, so the window is a zero-copy slice of the mapped file
+        dates = table['date'].to_numpy()
+        offset = int(np.searchsorted(dates, np.datetime64(start_date, 'D')))
+        table = table.slice(offset)
+    stock_data = table.select(list(columns)).to_pandas(date_as_object=True)
+    return stock_data.iloc[::-1].reset_index(drop=True)
+
+
+def sync(tickers=None):
+    """
+    rebuilds mirror files from Postgres (the source of truth) for the given tickers, or all of them
+    """
+    with connection() as conn, conn.cursor() as cursor:
+        if not tickers:
+            cursor.execute("SELECT ticker FROM ingest_watermark ORDER BY ticker;")
+            tickers = [row[0] for row in cursor.fetchall()]
+        for ticker in tickers:
+            stock_data = pd.read_sql("""
+                SELECT date, open_price::float8, close_price::float8, high_price::float8,
+                       low_price::float8, volume
+                FROM public.stocks WHERE ticker = %(ticker)s ORDER BY date;
+                """, conn, params={'ticker': ticker})
+            stock_data['date'] = pd.to_datetime(stock_data['date'], utc=True).dt.date
+            write_mirror(ticker, pa.Table.from_pandas(stock_data, schema=MIRROR_SCHEMA, preserve_index=False))
+            print(f"🗄️ mirrored {len(stock_data)} bars for {ticker}.")
+
+
+if __name__ == "__main__":
+    if pa is None:
+        sys.exit("pyarrow is required for the local mirror: pip install pyarrow")
+    sync(sys.argv[1:])
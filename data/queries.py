@@ -0,0 +1,174 @@
+import datetime as dt
+import pandas as pd
+from . import mirror
+from .db import read_sql
+from .intraday import MARKET_TIMEZONE, RESOLUTION_MINUTES
+
+# columns of the stocks table that callers may project
+PRICE_COLUMNS = ('date', 'open_price', 'close_price', 'high_price', 'low_price', 'volume')
+
+# columns the price chart and price info widgets need
+CHART_COLUMNS = ('date', 'open_price', 'close_price')
+
+# daily bars ('D') come from stocks, weekly ('W') and monthly ('M') bars from stock_rollups,
+# intraday bars ('1m', '5m', '15m', '1h', '1d') from intraday_bars
+RESOLUTIONS = ('D', 'W', 'M') + tuple(RESOLUTION_MINUTES)
+
+# intraday history may start a little after start_date (weekends, holidays) and still count as covering it
+INTRADAY_SLACK = dt.timedelta(days=3)
+
+# news articles read per page of the news panel
+NEWS_PAGE_SIZE = 10
+
+
+def fetch_stock_metadata(conn, ticker):
+    """
+    metadata row for one ticker from lu_stock
+    """
+    stock_metadata = pd.read_sql(
+        "SELECT * FROM public.lu_stock WHERE ticker = %(ticker)s;",
+        conn, params={'ticker': ticker})
+    stock_metadata['first_trade_date'] = pd.to_datetime(stock_metadata['first_trade_date']).dt.date
+    return stock_metadata
+
+
+def fetch_price_history(conn, ticker, start_date=None, columns=CHART_COLUMNS, resolution='D'):
+    """
+    price bars for one ticker at the given resolution, newest first, restricted to
+    dates on or after start_date (all history if None) and to the requested columns.
+    daily bars are served from the local mirror when it is enabled and has the ticker.
+    """
+    unknown = set(columns) - set(PRICE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Invalid price columns {sorted(unknown)} requested. Use any of {PRICE_COLUMNS}.")
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Invalid resolution '{resolution}' specified. Use one of {RESOLUTIONS}.")
+
+    if resolution in RESOLUTION_MINUTES:
+        stock_data = fetch_intraday_history(conn, ticker, start_date, columns, RESOLUTION_MINUTES[resolution])
+        if stock_data is not None:
+            return stock_data
+        # not enough intraday history yet, fall back to daily bars
+        resolution = 'D'
+
+    if resolution == 'D' and mirror.mirror_enabled():
+        stock_data = mirror.fetch_price_history(ticker, start_date, columns)
+        if stock_data is not None:
+            return stock_data
+
+    if resolution == 'D':
+        query = f"SELECT {', '.join(columns)} FROM public.stocks WHERE ticker = %(ticker)s"
+        date_column = 'date'
+    else:
+        select = ', '.join('period_start AS date' if column == 'date' else column for column in columns)
+        query = f"SELECT {select} FROM public.stock_rollups WHERE ticker = %(ticker)s AND period = %(resolution)s"
+        date_column = 'period_start'
+    if start_date is not None:
+        query += f" AND {date_column} >= %(start_date)s"
+    query += f" ORDER BY {date_column} DESC;"
+
+    stock_data = pd.read_sql(query, conn, params={'ticker': ticker, 'start_date': start_date,
+                                                  'resolution': resolution})
+    if 'date' in stock_data:
+        stock_data['date'] = pd.to_datetime(stock_data['date'], utc=True).dt.date
+    return stock_data
+
+
+def fetch_close_matrix(conn, tickers, start_date=None):
+    """
+    daily closes as a date x ticker frame (dates ascending, NaN where a ticker has no bar),
+    read in one query, or from the local mirror when it is enabled and has every ticker
+    """
+    tickers = list(tickers)
+    if mirror.mirror_enabled():
+        histories = {ticker: mirror.fetch_price_history(ticker, start_date, ('date', 'close_price'))
+                     for ticker in tickers}
+        if all(history is not None for history in histories.values()):
+            closes = pd.DataFrame({ticker: history.set_index('date')['close_price']
+                                   for ticker, history in histories.items()})
+            return closes.sort_index()[tickers]
+
+    query = """
+        SELECT ticker, date, close_price::float8 AS close_price FROM public.stocks
+        WHERE ticker = ANY(%(tickers)s)
+    """
+    if start_date is not None:
+        query += " AND date >= %(start_date)s"
+    stock_data = read_sql(query + ";", conn, params={'tickers': tickers, 'start_date': start_date})
+    stock_data['date'] = pd.to_datetime(stock_data['date'], utc=True).dt.date
+    closes = stock_data.pivot(index='date', columns='ticker', values='close_price').sort_index()
+    return closes.reindex(columns=tickers)
+
+
+def fetch_intraday_history(conn, ticker, start_date, columns, minutes):
+    """
+    intraday bars of the given size for one ticker, newest first, with dates as exchange-time
+    timestamps. returns None when the stored bars don't reach back to start_date.
+    """
+    select = ', '.join('ts AS date' if column == 'date' else column for column in columns)
+    query = f"SELECT {select} FROM public.intraday_bars WHERE ticker = %(ticker)s AND minutes = %(minutes)s"
+    if start_date is not None:
+        query += " AND ts >= %(start_date)s"
+    query += " ORDER BY ts DESC;"
+
+    stock_data = pd.read_sql(query, conn, params={'ticker': ticker, 'minutes': minutes, 'start_date': start_date})
+    if stock_data.empty:
+        return None
+    dates = pd.to_datetime(stock_data['date'], utc=True).dt.tz_convert(MARKET_TIMEZONE).dt.tz_localize(None)
+    if start_date is not None and dates.iloc[-1].date() > start_date + INTRADAY_SLACK:
+        return None
+    if 'date' in columns:
+        stock_data['date'] = dates
+    return stock_data
+
+
+def fetch_stock_stats(conn, ticker):
+    """
+    precomputed summary row for one ticker from stock_stats
+    """
+    return pd.read_sql(
+        "SELECT * FROM public.stock_stats WHERE ticker = %(ticker)s;",
+        conn, params={'ticker': ticker})
+
+
+def fetch_stock_news(conn, ticker, after=None, limit=NEWS_PAGE_SIZE):
+    """
+    one page of news articles linked to one ticker, newest first. after is the
+    (provider_publish_time, uuid) of the last article of the previous page, or None
+    for the first page; pages are read by keyset so each one costs the same.
+    """
+    query = """
+        SELECT links.ticker, news.date, news.uuid, news.title, news.publisher, news.link,
+               links.provider_publish_time, news.type, news.thumbnail_url, news.thumbnail_width,
+               news.thumbnail_height
+        FROM public.stock_news_tickers AS links
+        JOIN public.stock_news AS news ON news.uuid = links.uuid
+        WHERE links.ticker = %(ticker)s
+    """
+    if after is not None:
+        query += " AND (links.provider_publish_time, links.uuid) < (%(after_time)s, %(after_uuid)s)"
+    query += " ORDER BY links.provider_publish_time DESC, links.uuid DESC LIMIT %(limit)s;"
+
+    after_time, after_uuid = after or (None, None)
+    return pd.read_sql(query, conn, params={'ticker': ticker, 'after_time': after_time,
+                                           'after_uuid': after_uuid, 'limit': limit})
+
+
+def news_cursor(stock_news):
+    """
+    keyset cursor for the page after stock_news (a page returned by fetch_stock_news)
+    """
+    last = stock_news.iloc[-1]
+    return last['provider_publish_time'], last['uuid']
+
+
+def fetch_forecast(conn, ticker):
+    """
+    the newest forecast per horizon for one ticker, nearest horizon first
+    """
+    return pd.read_sql("""
+        SELECT DISTINCT ON (horizon) horizon, as_of_date, target_date, predicted_return, predicted_price
+        FROM public.predictions
+        WHERE ticker = %(ticker)s
+        ORDER BY horizon, as_of_date DESC;
+        """, conn, params={'ticker': ticker})
@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+from . import metrics
+
+
+class TokenBucket:
+    """
+    thread-safe token bucket shared by all ingestion workers.
+    the refill rate adapts to the upstream API: it is halved whenever a call is
+    throttled and creeps back up towards max_rate after successful calls.
+    """
+
+    def __init__(self, rate=5.0, capacity=10, min_rate=0.5, max_rate=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate or rate)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        block until a token is available, then take it
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self):
+        """
+        back off after the upstream API rejected a call
+        """
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+
+    def succeeded(self):
+        """
+        recover the rate additively after a successful call
+        """
+        with self.lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+
+def is_throttle_error(error):
+    """
+    check whether an exception means we were rate limited by the API
+    """
+    if type(error).__name__ == 'YFRateLimitError':
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in ('too many requests', 'rate limit', '429'))
+
+
+def call_with_retries(func, limiter, retries=4, backoff=1.0):
+    """
+    call func() under the limiter, retrying throttled calls with exponential backoff and jitter
+    """
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            result = func()
+        except Exception as e:
+            if not is_throttle_error(e) or attempt == retries:
+                raise
+            limiter.throttled()
+            metrics.inc('ingest_throttled_total')
+            delay = backoff * 2 ** attempt
+            time.sleep(delay + random.uniform(0, delay))
+        else:
+            limiter.succeeded()
+            return result
@@ -0,0 +1,115 @@
+import heapq
+import itertools
+import threading
+import time
+from .load_data import main as refresh_database
+
+# job priorities, lower runs first
+HIGH, LOW = 0, 1
+
+# tickers handed to one refresh run; the run fetches them concurrently
+BATCH_SIZE = 8
+
+# seconds to wait before retrying when another process holds the refresh lock
+LOCK_RETRY_DELAY = 10
+
+
+class RefreshQueue:
+    """
+    per-process background refresh queue drained by a single worker thread.
+    submitting a ticker that is already queued only raises its priority, and one that
+    is already running is ignored, so concurrent clicks never start duplicate work.
+    each run also takes the database-wide refresh lock, so refreshes stay single-flight
+    across processes too.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.heap = []
+        self.pending = {}  # ticker -> queued priority
+        self.status = {}  # ticker -> 'queued' | 'running' | 'done' | 'failed'
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.worker = threading.Thread(target=self._run, name='refresh-worker', daemon=True)
+        self.worker.start()
+
+    def submit(self, tickers, priority=LOW):
+        """
+        queue tickers for a refresh at the given priority
+        """
+        with self.lock:
+            for ticker in tickers:
+                if self.status.get(ticker) == 'running':
+                    continue
+                if ticker in self.pending and self.pending[ticker] <= priority:
+                    continue
+                self.pending[ticker] = priority
+                self.status[ticker] = 'queued'
+                heapq.heappush(self.heap, (priority, next(self.counter), ticker))
+            self.wakeup.set()
+
+    def progress(self, tickers=None):
+        """
+        snapshot of the queue for the UI: status per ticker and overall counts
+        """
+        with self.lock:
+            status = {ticker: state for ticker, state in self.status.items()
+                      if tickers is None or ticker in tickers}
+        counts = {state: sum(1 for value in status.values() if value == state)
+                  for state in ('queued', 'running', 'done', 'failed')}
+        return {'status': status, 'counts': counts,
+                'active': counts['queued'] + counts['running'] > 0}
+
+    def _next_batch(self):
+        """
+        pop up to batch_size tickers sharing the best queued priority; returns (batch, priority)
+        """
+        with self.lock:
+            batch, priority = [], None
+            while self.heap and len(batch) < self.batch_size:
+                entry_priority, _, ticker = self.heap[0]
+                if self.pending.get(ticker) != entry_priority:
+                    heapq.heappop(self.heap)  # stale entry, the ticker was re-queued at a higher priority
+                    continue
+                if priority is not None and entry_priority != priority:
+                    break
+                heapq.heappop(self.heap)
+                priority = entry_priority
+                del self.pending[ticker]
+                self.status[ticker] = 'running'
+                batch.append(ticker)
+            if not batch:
+                self.wakeup.clear()
+            return batch, priority
+
+    def _on_progress(self, ticker, ok):
+        with self.lock:
+            self.status[ticker] = 'done' if ok else 'failed'
+
+    def _finish(self, batch, ran, priority):
+        """
+        settle a batch after its run: requeue it if the lock was busy, else fail any ticker left running
+        """
+        with self.lock:
+            for ticker in batch:
+                if self.status.get(ticker) == 'running':
+                    self.status[ticker] = None if not ran else 'failed'
+        if not ran:
+            self.submit(batch, priority)
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            batch, priority = self._next_batch()
+            if not batch:
+                continue
+            ran = True
+            try:
+                ran = refresh_database(tickers=batch, on_progress=self._on_progress)
+            except Exception as e:
+                print(f"❌ background refresh failed: {e}")
+            self._finish(batch, ran, priority)
+            if not ran:
+                # another process is refreshing; try again shortly
+                time.sleep(LOCK_RETRY_DELAY)
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import pickle
+import time
+import pandas as pd
+import yfinance as yf
+from . import metrics
+from . import stub_source
+
+# a market data source is anything shaped like the parts of yfinance ingestion uses:
+# source.Ticker(symbol) with history(...), history_metadata and news, and source.download(...).
+# yfinance and the offline stub are the live sources; CachedSource wraps either with an
+# on-disk response cache, a recorder, or a replay of recorded fixtures.
+#
+# STOCK_DATA_SOURCE   yfinance (default) | stub | replay
+# SOURCE_CACHE_DIR    cache live responses here, each endpoint for its CACHE_TTLS seconds
+# SOURCE_RECORD=1     record every live response into SOURCE_FIXTURE_DIR
+# SOURCE_FIXTURE_DIR  recorded fixtures, served by STOCK_DATA_SOURCE=replay
+LIVE_SOURCES = {'yfinance': yf, 'stub': stub_source}
+SOURCES = (*LIVE_SOURCES, 'replay')
+
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# seconds a cached response stays fresh, per endpoint
+CACHE_TTLS = {
+    'history': 15 * 60,
+    'intraday': 60,
+    'download': 15 * 60,
+    'metadata': 15 * 60,
+    'news': 30 * 60,
+}
+
+# errors after which an expired cache entry is served rather than failing the fetch
+NETWORK_ERRORS = (OSError, ConnectionError, TimeoutError)
+
+
+class FixtureNotFound(LookupError):
+    """
+    raised by a replay source when a request was never recorded
+    """
+
+
+class CachedSource:
+    """
+    wraps a live source with a response store of one pickle file per request.
+    mode 'cache' serves fresh entries and refetches expired ones (keeping the expired
+    entry if the refetch hits a network error), 'record' always fetches and stores,
+    'replay' only serves stored entries and never calls source.
+    """
+
+    def __init__(self, source, directory, mode='cache', ttls=CACHE_TTLS):
+        self.source = source
+        self.directory = directory
+        self.mode = mode
+        self.ttls = ttls
+
+    def Ticker(self, ticker):
+        return CachedTicker(self, ticker)
+
+    def download(self, tickers, **kwargs):
+        return self.get('download', ','.join(sorted(tickers)), kwargs,
+                        lambda: self.source.download(tickers, **kwargs))
+
+    def path(self, endpoint, ticker, kwargs):
+        # the request's arguments, in a stable order, name the file
+        digest = hashlib.sha1(repr(sorted(kwargs.items())).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, endpoint, ticker, f"{digest}.pkl")
+
+    def read(self, path):
+        try:
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+
+    def write(self, path, value):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            pickle.dump((time.time(), value), file)
+        os.replace(tmp_path, path)
+
+    def get(self, endpoint, ticker, kwargs, fetch):
+        """
+        the response to one request, from the store or from fetch()
+        """
+        path = self.path(endpoint, ticker, kwargs)
+        entry = self.read(path) if self.mode != 'record' else None
+
+        if self.mode == 'replay':
+            if entry is None:
+                entry = self.replay_fallback(endpoint, ticker, kwargs)
+            if entry is None:
+                raise FixtureNotFound(f"no recorded {endpoint} response for {ticker} {kwargs} in {self.directory}")
+            return entry[1]
+
+        if entry is not None and time.time() - entry[0] < self.ttls.get(endpoint, 0):
+            metrics.inc('source_cache_total', endpoint=endpoint, result='hit')
+            return entry[1]
+        try:
+            value = fetch()
+        except NETWORK_ERRORS:
+            if entry is None:
+                raise
+            metrics.inc('source_cache_total', endpoint=endpoint, result='stale')
+            return entry[1]
+        metrics.inc('source_cache_total', endpoint=endpoint, result='miss')
+        self.write(path, value)
+        return value
+
+    def replay_fallback(self, endpoint, ticker, kwargs):
+        """
+        an unrecorded daily history request from a start date is cut from the
+        recorded full history, so replays don't depend on the database's watermarks
+        """
+        if endpoint != 'history' or kwargs.get('start') is None:
+            return None
+        entry = self.read(self.path(endpoint, ticker, {'period': 'max'}))
+        if entry is None:
+            return None
+        fetched_at, history = entry
+        return fetched_at, history[history.index.date >= pd.Timestamp(kwargs['start']).date()]
+
+
+class CachedTicker:
+    """
+    mimics yfinance.Ticker on top of a CachedSource; the live ticker is only created on a miss
+    """
+
+    def __init__(self, cached_source, ticker):
+        self.cached_source = cached_source
+        self.ticker = ticker
+        self._live = None
+
+    def live(self):
+        if self._live is None:
+            self._live = self.cached_source.source.Ticker(self.ticker)
+        return self._live
+
+    def history(self, **kwargs):
+        endpoint = 'history' if kwargs.get('interval', '1d') == '1d' else 'intraday'
+        return self.cached_source.get(endpoint, self.ticker, kwargs, lambda: self.fetch_history(kwargs))
+
+    def fetch_history(self, kwargs):
+        """
+        a live history request; the metadata that comes with it is stored too, since a
+        later metadata miss would make yfinance request history again to read it
+        """
+        history = self.live().history(**kwargs)
+        self.cached_source.write(self.cached_source.path('metadata', self.ticker, {}), self.live().history_metadata)
+        return history
+
+    @property
+    def history_metadata(self):
+        return self.cached_source.get('metadata', self.ticker, {}, lambda: self.live().history_metadata)
+
+    @property
+    def news(self):
+        return self.cached_source.get('news', self.ticker, {}, lambda: self.live().news)
+
+
+def market_data():
+    """
+    the configured market data source (see the top of this module)
+    """
+    name = os.getenv('STOCK_DATA_SOURCE', 'yfinance')
+    if name not in SOURCES:
+        raise ValueError(f"Invalid data source '{name}' specified. Use one of {SOURCES}.")
+    fixture_dir = os.getenv('SOURCE_FIXTURE_DIR', DEFAULT_FIXTURE_DIR)
+    if name == 'replay':
+        return CachedSource(None, fixture_dir, mode='replay')
+
+    source = LIVE_SOURCES[name]
+    if os.getenv('SOURCE_RECORD') == '1':
+        return CachedSource(source, fixture_dir, mode='record')
+    if os.getenv('SOURCE_CACHE_DIR'):
+        return CachedSource(source, os.environ['SOURCE_CACHE_DIR'])
+    return source
@@ -0,0 +1,123 @@
+import datetime as dt
+import zlib
+import numpy as np
+import pandas as pd
+
+# deterministic, offline stand-in for the parts of yfinance used by load_data.
+# selected with STOCK_DATA_SOURCE=stub, e.g. for `airflow dags test` without network access.
+
+# first synthetic trading day
+STUB_START = dt.date(2015, 1, 2)
+
+# number of recent sessions served as 1-minute bars, like yfinance's short intraday window
+STUB_INTRADAY_SESSIONS = 5
+
+
+def _seed(ticker):
+    return zlib.crc32(ticker.encode())
+
+
+def _bars(ticker, start=None):
+    """
+    synthetic daily OHLCV bars from STUB_START to today, random walk seeded by the ticker
+    """
+    index = pd.bdate_range(STUB_START, dt.date.today(), tz='America/New_York')
+    rng = np.random.default_rng(_seed(ticker))
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(index))))
+    open_ = close * (1 + rng.normal(0, 0.003, len(index)))
+    bars = pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, len(index))),
+        'Low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, len(index))),
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 50_000_000, len(index)),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=index)
+    if start is not None:
+        bars = bars[bars.index.date >= pd.Timestamp(start).date()]
+    return bars
+
+
+def _minute_bars(ticker, start=None):
+    """
+    synthetic 1-minute bars for the regular session (09:30-16:00 New York) of the last
+    few weekdays, a random walk anchored at the ticker's daily closes
+    """
+    sessions = pd.bdate_range(end=dt.date.today(), periods=STUB_INTRADAY_SESSIONS)
+    index = pd.DatetimeIndex([
+        minute for session in sessions
+        for minute in pd.date_range(f"{session.date()} 09:30", periods=390, freq='min', tz='America/New_York')
+    ])
+    now = pd.Timestamp.now(tz='America/New_York')
+    index = index[index <= now]
+    rng = np.random.default_rng(_seed(ticker) + 1)
+    anchor = float(_bars(ticker)['Close'].iloc[-1])
+    close = anchor * np.exp(np.cumsum(rng.normal(0, 0.0008, len(index))))
+    open_ = np.concatenate([[anchor], close[:-1]])
+    bars = pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + rng.uniform(0, 0.0005, len(index))),
+        'Low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.0005, len(index))),
+        'Close': close,
+        'Volume': rng.integers(1_000, 100_000, len(index)),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0,
+    }, index=index)
+    if start is not None:
+        start = pd.Timestamp(start)
+        start = start.tz_localize('America/New_York') if start.tzinfo is None else start
+        bars = bars[bars.index >= start]
+    return bars
+
+
+class Ticker:
+    """
+    mimics yfinance.Ticker: history(), history_metadata and news
+    """
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+
+    def history(self, period=None, start=None, interval='1d', **kwargs):
+        if interval != '1d':
+            return _minute_bars(self.ticker, start)
+        return _bars(self.ticker, start)
+
+    @property
+    def history_metadata(self):
+        close = _bars(self.ticker)['Close']
+        return {
+            'currency': 'USD', 'exchangeName': 'STUB', 'fullExchangeName': 'Stub Exchange',
+            'instrumentType': 'EQUITY',
+            'firstTradeDate': int(pd.Timestamp(STUB_START).timestamp()),
+            'regularMarketPrice': float(close.iloc[-1]),
+            'fiftyTwoWeekHigh': float(close.iloc[-252:].max()),
+            'fiftyTwoWeekLow': float(close.iloc[-252:].min()),
+            'regularMarketDayHigh': float(close.iloc[-1] * 1.01),
+            'regularMarketDayLow': float(close.iloc[-1] * 0.99),
+            'regularMarketVolume': 10_000_000,
+            'longName': f"{self.ticker} (stub)", 'shortName': self.ticker,
+            'chartPreviousClose': float(close.iloc[-2]),
+            'timezone': 'EDT', 'exchangeTimezoneName': 'America/New_York',
+        }
+
+    @property
+    def news(self):
+        today = int(pd.Timestamp(dt.date.today()).timestamp())
+        return [{
+            'uuid': f"stub-{self.ticker}-{today}-{i}",
+            'title': f"{self.ticker} stub headline {i}",
+            'publisher': 'Stub Wire',
+            'link': 'https://example.com',
+            'providerPublishTime': today + i * 3600,
+            'type': 'STORY',
+            'relatedTickers': [self.ticker],
+        } for i in range(3)]
+
+
+def download(tickers, start=None, group_by='ticker', **kwargs):
+    """
+    mimics yfinance.download(..., group_by='ticker'): columns keyed by (ticker, field)
+    """
+    return pd.concat({ticker: _bars(ticker, start) for ticker in tickers}, axis=1)
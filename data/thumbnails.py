@@ -0,0 +1,94 @@
+import hashlib
+import io
+import os
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Pillow is optional; without it no thumbnails are cached and the news panel shows text only
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# one small JPEG per article, named after a hash of its uuid; next to this module
+# unless THUMBNAIL_DIR says otherwise, whatever directory the app or ingest runs from
+THUMBNAIL_DIR = os.path.abspath(os.getenv('THUMBNAIL_DIR')
+                                or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thumbnails'))
+
+# width the news panel displays thumbnails at; images are resized to this once, at ingest
+THUMBNAIL_WIDTH = 120
+
+# seconds to wait for a remote image before giving up on it
+DOWNLOAD_TIMEOUT = 10
+
+
+def thumbnails_enabled():
+    return Image is not None
+
+
+def thumbnail_path(uuid):
+    return os.path.join(THUMBNAIL_DIR, f"{hashlib.sha1(uuid.encode()).hexdigest()}.jpg")
+
+
+def cached_thumbnail(uuid):
+    """
+    path of the article's cached thumbnail, or None if there is none
+    """
+    path = thumbnail_path(uuid)
+    return path if os.path.exists(path) else None
+
+
+def pick_resolution(article):
+    """
+    url of the smallest thumbnail resolution that is still at least THUMBNAIL_WIDTH wide
+    """
+    resolutions = [resolution for resolution in (article.get('thumbnail') or {}).get('resolutions', [])
+                   if resolution.get('url')]
+    if not resolutions:
+        return None
+    wide_enough = [resolution for resolution in resolutions if (resolution.get('width') or 0) >= THUMBNAIL_WIDTH]
+    return min(wide_enough or resolutions, key=lambda resolution: resolution.get('width') or 0)['url']
+
+
+def cache_thumbnail(uuid, url):
+    """
+    downloads one image, shrinks it to THUMBNAIL_WIDTH and writes it to the cache
+    """
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        image = Image.open(io.BytesIO(response.read())).convert('RGB')
+    image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+
+    # write to a temporary file first so readers never see a partial image
+    path = thumbnail_path(uuid)
+    tmp_path = f"{path}.tmp"
+    image.save(tmp_path, 'JPEG', quality=80, optimize=True)
+    os.replace(tmp_path, path)
+
+
+def cache_thumbnails(news_by_ticker, max_workers=4):
+    """
+    caches the thumbnails of every article in the given news feeds ({ticker: articles})
+    that isn't cached yet. returns the number of thumbnails written.
+    """
+    if not thumbnails_enabled():
+        return 0
+    pending = {}
+    for news_data in news_by_ticker.values():
+        for article in news_data or []:
+            url = pick_resolution(article)
+            if url and article['uuid'] not in pending and cached_thumbnail(article['uuid']) is None:
+                pending[article['uuid']] = url
+    if not pending:
+        return 0
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    written = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(cache_thumbnail, uuid, url): uuid for uuid, url in pending.items()}
+        for future, uuid in futures.items():
+            try:
+                future.result()
+                written += 1
+            except Exception as e:
+                print(f"⚠️ could not cache the thumbnail of article {uuid}: {e}")
+    return written
@@ -0,0 +1,246 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+# make the repo root importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import connection
+from data.load_data import load_tickers
+from data.queries import fetch_close_matrix
+from models.features import rolling_mean, rolling_std, shift
+
+# trading days per year, for annualizing
+TRADING_DAYS = 252
+
+# parameter combinations evaluated per batch (and per worker task)
+GRID_BATCH = 16
+
+# default parameter grid per strategy
+PARAMETER_GRIDS = {
+    'sma_cross': {'fast': [5, 10, 20, 50], 'slow': [50, 100, 200]},
+    'momentum': {'lookback': [20, 60, 120, 250], 'threshold': [0.0, 0.05]},
+    'mean_reversion': {'window': [10, 20, 50], 'entry_z': [1.0, 1.5, 2.0]},
+}
+
+# default trading costs, in basis points of traded value: a flat commission, a flat
+# slippage, and a slippage share of the ticker's daily volatility (wider spreads when volatile)
+COMMISSION_BPS = 1.0
+SLIPPAGE_BPS = 2.0
+SLIPPAGE_VOL_SHARE = 0.05
+
+# trailing days of returns the slippage volatility is measured over
+VOLATILITY_WINDOW = 20
+
+
+def sma_cross(closes, fast, slow, cache):
+    """
+    long while the fast moving average is above the slow one
+    """
+    if fast >= slow:
+        return None
+    fast_ma = cached(cache, ('sma', fast), lambda: rolling_mean(closes, fast))
+    slow_ma = cached(cache, ('sma', slow), lambda: rolling_mean(closes, slow))
+    return (fast_ma > slow_ma).astype(float)
+
+
+def momentum(closes, lookback, threshold, cache):
+    """
+    long while the trailing lookback return is above threshold
+    """
+    trailing = cached(cache, ('momentum', lookback), lambda: closes / shift(closes, lookback) - 1)
+    return (trailing > threshold).astype(float)
+
+
+def mean_reversion(closes, window, entry_z, cache):
+    """
+    long while the close is more than entry_z standard deviations below its moving average
+    """
+    mean = cached(cache, ('sma', window), lambda: rolling_mean(closes, window))
+    std = cached(cache, ('std', window), lambda: rolling_std(closes, window))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return ((closes - mean) / std < -entry_z).astype(float)
+
+
+STRATEGIES = {
+    'sma_cross': sma_cross,
+    'momentum': momentum,
+    'mean_reversion': mean_reversion,
+}
+
+
+def cached(cache, key, compute):
+    """
+    indicator matrices shared by every parameter combination of a batch
+    """
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def simulate(closes, positions, commission_bps=COMMISSION_BPS, slippage_bps=SLIPPAGE_BPS,
+             slippage_vol_share=SLIPPAGE_VOL_SHARE, daily_vol=None):
+    """
+    daily returns of an equal-weight portfolio holding the (time x ticker) target positions.
+    a position decided on a bar's close is held from the next bar, and every change in
+    position pays commission plus slippage on the traded amount.
+    returns the portfolio returns and the average turnover per day.
+    """
+    returns = np.nan_to_num(closes / shift(closes, 1) - 1)
+    held = np.nan_to_num(shift(positions, 1))
+    traded = np.abs(np.diff(held, axis=0, prepend=0))
+    cost_rate = (commission_bps + slippage_bps) / 1e4
+    if daily_vol is not None:
+        cost_rate = cost_rate + slippage_vol_share * np.nan_to_num(daily_vol)
+    ticker_returns = held * returns - traded * cost_rate
+
+    # equal weight across the tickers trading on each day
+    trading = ~np.isnan(closes)
+    counts = np.maximum(trading.sum(axis=1), 1)
+    portfolio = (ticker_returns * trading).sum(axis=1) / counts
+    return portfolio, float((traded * trading).sum(axis=1).mean() / counts.mean())
+
+
+def summarize(portfolio, turnover):
+    """
+    summary metrics of a daily portfolio return series
+    """
+    equity = np.cumprod(1 + portfolio)
+    years = len(portfolio) / TRADING_DAYS
+    volatility = portfolio.std() * np.sqrt(TRADING_DAYS)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    return {
+        'total_return': float(equity[-1] - 1),
+        'cagr': float(equity[-1] ** (1 / years) - 1) if years > 0 and equity[-1] > 0 else float('nan'),
+        'volatility': float(volatility),
+        'sharpe': float(portfolio.mean() * TRADING_DAYS / volatility) if volatility > 0 else float('nan'),
+        'max_drawdown': float(drawdown.min()),
+        'turnover': turnover,
+        'hit_rate': float((portfolio[portfolio != 0] > 0).mean()) if (portfolio != 0).any() else float('nan'),
+    }
+
+
+# set in each worker process by init_worker
+_worker = {}
+
+
+def init_worker(closes, costs):
+    """
+    process pool initializer: receives the close matrix once per worker, not once per task
+    """
+    _worker['closes'] = closes
+    _worker['costs'] = costs
+    _worker['daily_vol'] = rolling_std(np.nan_to_num(closes / shift(closes, 1) - 1), VOLATILITY_WINDOW)
+
+
+def run_batch(strategy, combinations):
+    """
+    evaluates a batch of parameter combinations of one strategy; indicators shared by
+    several combinations are computed once. returns (parameters, metrics, equity) per combination.
+    """
+    closes, costs = _worker['closes'], _worker['costs']
+    cache, results = {}, []
+    for parameters in combinations:
+        positions = STRATEGIES[strategy](closes, **parameters, cache=cache)
+        if positions is None:
+            continue
+        portfolio, turnover = simulate(closes, positions, daily_vol=_worker['daily_vol'], **costs)
+        results.append((parameters, summarize(portfolio, turnover), np.cumprod(1 + portfolio)))
+    return results
+
+
+def evaluate_positions(close_matrix, positions, costs=None):
+    """
+    backtests any (date x ticker) target position frame aligned with close_matrix, e.g.
+    signals derived from model forecasts. returns the summary metrics and the equity curve.
+    """
+    closes = close_matrix.to_numpy()
+    costs = {'commission_bps': COMMISSION_BPS, 'slippage_bps': SLIPPAGE_BPS,
+             'slippage_vol_share': SLIPPAGE_VOL_SHARE, **(costs or {})}
+    daily_vol = rolling_std(np.nan_to_num(closes / shift(closes, 1) - 1), VOLATILITY_WINDOW)
+    portfolio, turnover = simulate(closes, positions.reindex_like(close_matrix).to_numpy(dtype=float),
+                                   daily_vol=daily_vol, **costs)
+    return summarize(portfolio, turnover), pd.Series(np.cumprod(1 + portfolio), index=close_matrix.index)
+
+
+def parameter_grid(grid):
+    """
+    every combination of a {parameter: values} grid
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def backtest(strategy, tickers=None, start_date=None, grid=None, costs=None, max_workers=None):
+    """
+    sweeps the strategy's parameter grid over the tickers' daily closes, GRID_BATCH
+    combinations per task, fanned out over max_workers processes (1 runs in-process).
+    returns the summary metrics per combination and the equity curves (date x combination).
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Invalid strategy '{strategy}' specified. Use one of {tuple(STRATEGIES)}.")
+    combinations = parameter_grid(grid or PARAMETER_GRIDS[strategy])
+    costs = {'commission_bps': COMMISSION_BPS, 'slippage_bps': SLIPPAGE_BPS,
+             'slippage_vol_share': SLIPPAGE_VOL_SHARE, **(costs or {})}
+
+    with connection() as conn:
+        close_matrix = fetch_close_matrix(conn, tickers or load_tickers(), start_date)
+    closes = close_matrix.to_numpy()
+    batches = [combinations[i:i + GRID_BATCH] for i in range(0, len(combinations), GRID_BATCH)]
+    max_workers = max_workers or os.cpu_count()
+
+    start = time.perf_counter()
+    print(f"----- backtesting {len(combinations)} {strategy} combinations on {closes.shape[1]} tickers x "
+          f"{closes.shape[0]} days with {max_workers} processes ... -----")
+    results = []
+    if max_workers == 1:
+        init_worker(closes, costs)
+        for batch in batches:
+            results.extend(run_batch(strategy, batch))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                 initargs=(closes, costs)) as executor:
+            futures = [executor.submit(run_batch, strategy, batch) for batch in batches]
+            for future in as_completed(futures):
+                results.extend(future.result())
+    print(f"----- {len(results)} combinations evaluated in {time.perf_counter() - start:.1f}s -----")
+
+    labels = [', '.join(f"{name}={value}" for name, value in parameters.items()) for parameters, _, _ in results]
+    summary = pd.DataFrame([{'strategy': strategy, 'parameters': label, **metrics}
+                            for label, (_, metrics, _) in zip(labels, results)])
+    equity = pd.DataFrame({label: curve for label, (_, _, curve) in zip(labels, results)}, index=close_matrix.index)
+    return summary.sort_values('sharpe', ascending=False).reset_index(drop=True), equity
+
+
+def main():
+    parser = argparse.ArgumentParser(description="vectorized backtest of a strategy's parameter grid")
+    parser.add_argument('strategy', choices=list(STRATEGIES))
+    parser.add_argument('tickers', nargs='*', help="tickers to trade (default: every ticker in data/stocks.csv)")
+    parser.add_argument('--start', type=pd.Timestamp, help="first date of the backtest (YYYY-MM-DD)")
+    parser.add_argument('--commission-bps', type=float, default=COMMISSION_BPS)
+    parser.add_argument('--slippage-bps', type=float, default=SLIPPAGE_BPS)
+    parser.add_argument('--slippage-vol-share', type=float, default=SLIPPAGE_VOL_SHARE)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: every core)")
+    parser.add_argument('--output', help="directory to write summary.csv and equity.csv to")
+    args = parser.parse_args()
+
+    summary, equity = backtest(
+        args.strategy, args.tickers, args.start.date() if args.start else None,
+        costs={'commission_bps': args.commission_bps, 'slippage_bps': args.slippage_bps,
+               'slippage_vol_share': args.slippage_vol_share},
+        max_workers=args.workers)
+    print(summary.to_string(float_format=lambda value: f"{value:.4f}"))
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        summary.to_csv(os.path.join(args.output, 'summary.csv'), index=False)
+        equity.to_csv(os.path.join(args.output, 'equity.csv'))
+        print(f"📝 results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import io
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# make the repo root importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import connection, execute_values
+
+# columns of the features table after (ticker, date), in insert order
+FEATURE_COLUMNS = (
+    'close_price', 'ret_1', 'ret_5', 'ret_20', 'ret_lag_1', 'ret_lag_2', 'ret_lag_5',
+    'sma_10', 'sma_20', 'sma_50', 'ema_12', 'ema_26', 'macd', 'macd_signal', 'macd_hist',
+    'rsi_14', 'volatility_20',
+)
+
+# indicator parameters
+SMA_WINDOWS = (10, 20, 50)
+EMA_SPANS = (12, 26)
+MACD_SIGNAL_SPAN = 9
+RSI_PERIOD = 14
+VOLATILITY_WINDOW = 20
+RETURN_HORIZONS = (1, 5, 20)
+RETURN_LAGS = (1, 2, 5)
+
+# closes carried between runs: enough for the longest rolling window plus one return
+TAIL_BARS = max(SMA_WINDOWS + RETURN_HORIZONS + (VOLATILITY_WINDOW + 1,)) + 1
+
+# rows per closed-form EMA step; keeps the growing decay powers well inside float64 range
+EMA_CHUNK = 128
+
+# tickers computed together in one (time x ticker) matrix
+TICKER_BATCH = 100
+
+
+def ema(values, alpha, seed):
+    """
+    exponential moving average down the rows of a (time x ticker) matrix, starting from
+    seed (one value per column). rows are processed in chunks with the closed form
+    ema_t = d^t * (d * seed + alpha * sum_k x_k / d^k) where d = 1 - alpha, so the
+    only Python loop is over chunks. returns the averages and the last row (the next seed).
+    """
+    decay = 1 - alpha
+    out = np.empty_like(values)
+    for start in range(0, len(values), EMA_CHUNK):
+        chunk = values[start:start + EMA_CHUNK]
+        powers = decay ** np.arange(len(chunk))[:, None]
+        out[start:start + len(chunk)] = powers * (decay * seed + alpha * np.cumsum(chunk / powers, axis=0))
+        seed = out[start + len(chunk) - 1]
+    return out, seed
+
+
+def rolling_mean(values, window):
+    """
+    trailing mean over full windows only (NaN until a column has window values)
+    """
+    totals = np.nancumsum(values, axis=0)
+    counts = np.cumsum(~np.isnan(values), axis=0)
+    totals[window:] = totals[window:] - totals[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    return np.where(counts == window, totals / window, np.nan)
+
+
+def rolling_std(values, window):
+    """
+    trailing sample standard deviation over full windows only
+    """
+    mean = rolling_mean(values, window)
+    mean_sq = rolling_mean(values ** 2, window)
+    return np.sqrt(np.maximum(mean_sq - mean ** 2, 0) * window / (window - 1))
+
+
+def shift(values, periods):
+    """
+    moves rows down by periods, filling the top with NaN
+    """
+    shifted = np.full_like(values, np.nan)
+    shifted[periods:] = values[:-periods]
+    return shifted
+
+
+def compute_features(closes, is_new, state):
+    """
+    computes every feature for a (time x ticker) matrix of closes, left-padded with NaN.
+    rows where is_new is False are the carried-over tail (or padding): they feed the
+    rolling windows but the EMAs are held at their seeds until the first new row.
+    state holds the seeds per column; returns the feature matrices and the updated seeds.
+    """
+    log_close = np.log(closes)
+    features = {'close_price': closes}
+    for horizon in RETURN_HORIZONS:
+        features[f'ret_{horizon}'] = log_close - shift(log_close, horizon)
+    for lag in RETURN_LAGS:
+        features[f'ret_lag_{lag}'] = shift(features['ret_1'], lag)
+    for window in SMA_WINDOWS:
+        features[f'sma_{window}'] = rolling_mean(closes, window)
+    features['volatility_20'] = rolling_std(features['ret_1'], VOLATILITY_WINDOW) * np.sqrt(252)
+
+    seeds = {}
+    for span in EMA_SPANS:
+        key = f'ema_{span}'
+        features[key], seeds[key] = ema(np.where(is_new, closes, state[key]), 2 / (span + 1), state[key])
+    features['macd'] = features['ema_12'] - features['ema_26']
+    features['macd_signal'], seeds['macd_signal'] = ema(
+        np.where(is_new, features['macd'], state['macd_signal']), 2 / (MACD_SIGNAL_SPAN + 1), state['macd_signal'])
+    features['macd_hist'] = features['macd'] - features['macd_signal']
+
+    # Wilder's RSI: smoothed average gains and losses
+    change = np.nan_to_num(closes - shift(closes, 1))
+    alpha = 1 / RSI_PERIOD
+    gain, seeds['rsi_gain'] = ema(np.where(is_new, np.maximum(change, 0), state['rsi_gain']), alpha, state['rsi_gain'])
+    loss, seeds['rsi_loss'] = ema(np.where(is_new, np.maximum(-change, 0), state['rsi_loss']), alpha, state['rsi_loss'])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        features['rsi_14'] = 100 * gain / (gain + loss)
+    return features, seeds
+
+
+def get_feature_state(cursor, tickers):
+    """
+    carried-over state per ticker: last computed date, EMA seeds and the tail of closes
+    """
+    cursor.execute("""
+        SELECT ticker, last_date, ema_12, ema_26, macd_signal, rsi_gain, rsi_loss, close_tail
+        FROM feature_state WHERE ticker = ANY(%s);
+    """, (list(tickers),))
+    columns = [column.name for column in cursor.description]
+    return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+
+def get_new_bars(conn, tickers):
+    """
+    closes newer than each ticker's last computed date, oldest first
+    """
+    return pd.read_sql("""
+        SELECT stocks.ticker, stocks.date, stocks.close_price::float8 AS close_price
+        FROM public.stocks
+        LEFT JOIN public.feature_state USING (ticker)
+        WHERE stocks.ticker = ANY(%(tickers)s)
+          AND (feature_state.last_date IS NULL OR stocks.date > feature_state.last_date)
+          -- skips NULL and NaN closes: NaN sorts above Infinity in Postgres and DuckDB alike
+          AND stocks.close_price::float8 < 'Infinity'::float8
+        ORDER BY stocks.ticker, stocks.date;
+        """, conn, params={'tickers': list(tickers)})
+
+
+def build_matrix(new_bars, states, tickers):
+    """
+    stacks each ticker's tail and new closes into left-padded (time x ticker) matrices
+    and collects the seeds; tickers without state are seeded from their first close
+    """
+    series = {ticker: bars['close_price'].to_numpy() for ticker, bars in new_bars.groupby('ticker')}
+    columns, state = [], {key: [] for key in ('ema_12', 'ema_26', 'macd_signal', 'rsi_gain', 'rsi_loss')}
+    for ticker in tickers:
+        new = series[ticker]
+        ticker_state = states.get(ticker)
+        if ticker_state is None:
+            tail = np.array([])
+            seeds = {'ema_12': new[0], 'ema_26': new[0], 'macd_signal': 0.0, 'rsi_gain': 0.0, 'rsi_loss': 0.0}
+        else:
+            tail = np.array(ticker_state['close_tail'], dtype=float)
+            seeds = ticker_state
+        columns.append((tail, new))
+        for key in state:
+            state[key].append(seeds[key])
+
+    length = max(len(tail) + len(new) for tail, new in columns)
+    closes = np.full((length, len(tickers)), np.nan)
+    is_new = np.zeros((length, len(tickers)), dtype=bool)
+    for i, (tail, new) in enumerate(columns):
+        closes[length - len(tail) - len(new):, i] = np.concatenate([tail, new])
+        is_new[length - len(new):, i] = True
+    return closes, is_new, {key: np.array(values, dtype=float) for key, values in state.items()}
+
+
+def write_features(cursor, tickers, new_bars, features, seeds, closes):
+    """
+    COPYs the new feature rows and saves each ticker's state; the caller owns the transaction
+    """
+    positions = {ticker: i for i, ticker in enumerate(tickers)}
+    frames = []
+    for ticker, bars in new_bars.groupby('ticker', sort=False):
+        frame = pd.DataFrame({column: features[column][-len(bars):, positions[ticker]]
+                              for column in FEATURE_COLUMNS})
+        frame.insert(0, 'date', bars['date'].to_numpy())
+        frame.insert(0, 'ticker', ticker)
+        frames.append(frame)
+    buffer = io.StringIO()
+    pd.concat(frames).to_csv(buffer, sep='\t', header=False, index=False, na_rep='\\N')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY features (ticker, date, {', '.join(FEATURE_COLUMNS)}) FROM STDIN", buffer)
+
+    last_dates = new_bars.groupby('ticker')['date'].max()
+    rows = []
+    for i, ticker in enumerate(tickers):
+        tail = closes[:, i][~np.isnan(closes[:, i])][-TAIL_BARS:]
+        rows.append((ticker, last_dates[ticker], *(float(seeds[key][i]) for key in
+                     ('ema_12', 'ema_26', 'macd_signal', 'rsi_gain', 'rsi_loss')), tail.tolist()))
+    execute_values(cursor, """
+        INSERT INTO feature_state (ticker, last_date, ema_12, ema_26, macd_signal, rsi_gain, rsi_loss, close_tail)
+        VALUES %s
+        ON CONFLICT (ticker) DO UPDATE SET
+            last_date = EXCLUDED.last_date,
+            ema_12 = EXCLUDED.ema_12,
+            ema_26 = EXCLUDED.ema_26,
+            macd_signal = EXCLUDED.macd_signal,
+            rsi_gain = EXCLUDED.rsi_gain,
+            rsi_loss = EXCLUDED.rsi_loss,
+            close_tail = EXCLUDED.close_tail,
+            updated_at = CURRENT_TIMESTAMP
+        """, rows, page_size=len(rows))
+
+
+def reset_features(cursor, tickers):
+    """
+    drops the stored features and state of the given tickers so they are recomputed in full
+    """
+    cursor.execute("DELETE FROM features WHERE ticker = ANY(%s);", (list(tickers),))
+    cursor.execute("DELETE FROM feature_state WHERE ticker = ANY(%s);", (list(tickers),))
+
+
+def fetch_features(conn, tickers, start_date=None, columns=FEATURE_COLUMNS):
+    """
+    stored features for one or more tickers, oldest first, restricted to dates on or
+    after start_date (all history if None) and to the requested feature columns
+    """
+    unknown = set(columns) - set(FEATURE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Invalid feature columns {sorted(unknown)} requested. Use any of {FEATURE_COLUMNS}.")
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    query = f"SELECT ticker, date, {', '.join(columns)} FROM public.features WHERE ticker = ANY(%(tickers)s)"
+    if start_date is not None:
+        query += " AND date >= %(start_date)s"
+    query += " ORDER BY ticker, date;"
+    return pd.read_sql(query, conn, params={'tickers': tickers, 'start_date': start_date})
+
+
+def compute_batch(conn, cursor, tickers, full=False):
+    """
+    computes features for every bar newer than each given ticker's last computed bar
+    (all bars with full). the caller owns the transaction. returns the number of feature
+    rows written.
+    """
+    if full:
+        reset_features(cursor, tickers)
+    states = get_feature_state(cursor, tickers)
+    new_bars = get_new_bars(conn, tickers)
+    if new_bars.empty:
+        return 0
+    tickers = [ticker for ticker in tickers if ticker in set(new_bars['ticker'])]
+    closes, is_new, state = build_matrix(new_bars, states, tickers)
+    features, seeds = compute_features(closes, is_new, state)
+    write_features(cursor, tickers, new_bars, features, seeds, closes)
+    print(f"🧮 features computed for {len(tickers)} tickers ({len(new_bars)} new bars).")
+    return len(new_bars)
+
+
+def update_features(tickers=None, full=False):
+    """
+    computes features for every bar newer than each ticker's last computed bar, for the
+    given tickers (default: every ingested ticker), in batches of TICKER_BATCH tickers.
+    full recomputes the tickers from scratch. returns the number of feature rows written.
+    """
+    written = 0
+    with connection() as conn, conn.cursor() as cursor:
+        if not tickers:
+            cursor.execute("SELECT ticker FROM ingest_watermark ORDER BY ticker;")
+            tickers = [row[0] for row in cursor.fetchall()]
+        for start in range(0, len(tickers), TICKER_BATCH):
+            with conn:
+                written += compute_batch(conn, cursor, tickers[start:start + TICKER_BATCH], full)
+    return written
+
+
+if __name__ == "__main__":
+    # python -m models.features [--full] [TICKER ...]
+    update_features([arg for arg in sys.argv[1:] if arg != '--full'] or None, full='--full' in sys.argv)
@@ -0,0 +1,72 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# make the repo root importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import connection, execute_values
+from models.registry import active_models, load_artifact
+from models.train import INPUT_COLUMNS, design_inputs
+
+
+def latest_features(conn, tickers):
+    """
+    the newest features row of each ticker
+    """
+    return pd.read_sql("""
+        SELECT DISTINCT ON (ticker) * FROM public.features
+        WHERE ticker = ANY(%(tickers)s)
+        ORDER BY ticker, date DESC;
+        """, conn, params={'tickers': list(tickers)})
+
+
+def predict(tickers=None):
+    """
+    batch inference: runs every active model on its ticker's newest features and
+    upserts one forecast per (ticker, horizon) into predictions. returns the number written.
+    """
+    with connection() as conn, conn.cursor() as cursor:
+        models = active_models(cursor, tickers)
+        if not models:
+            print("no active models; train some with `python -m models.train --register`.")
+            return 0
+        features = latest_features(conn, {model['ticker'] for model in models}).set_index('ticker')
+        inputs = design_inputs(features)
+
+        rows = []
+        for model in models:
+            ticker = model['ticker']
+            if ticker not in inputs.index or inputs.loc[ticker].isna().any():
+                print(f"⚠️ {ticker}: no complete features to predict from.")
+                continue
+            if tuple(model['input_columns']) != INPUT_COLUMNS:
+                print(f"⚠️ {ticker}: model {model['model_id']} was trained on different inputs; retrain it.")
+                continue
+
+            predicted_return = float(load_artifact(model['artifact_path']).predict(
+                inputs.loc[[ticker]].to_numpy())[0])
+            as_of_date = features.loc[ticker, 'date']
+            target_date = np.busday_offset(as_of_date, model['horizon'], roll='forward').astype(object)
+            rows.append((ticker, model['horizon'], as_of_date, target_date, model['model_id'], predicted_return,
+                         float(features.loc[ticker, 'close_price'] * np.exp(predicted_return))))
+
+        if rows:
+            execute_values(cursor, """
+                INSERT INTO predictions (ticker, horizon, as_of_date, target_date, model_id,
+                                         predicted_return, predicted_price)
+                VALUES %s
+                ON CONFLICT (ticker, horizon, as_of_date) DO UPDATE SET
+                    target_date = EXCLUDED.target_date,
+                    model_id = EXCLUDED.model_id,
+                    predicted_return = EXCLUDED.predicted_return,
+                    predicted_price = EXCLUDED.predicted_price,
+                    created_at = CURRENT_TIMESTAMP
+                """, rows, page_size=len(rows))
+    print(f"🔮 {len(rows)} forecasts written for {len({row[0] for row in rows})} tickers.")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    predict(sys.argv[1:] or None)
@@ -0,0 +1,73 @@
+import datetime as dt
+import json
+import os
+import joblib
+
+# serialized models, one directory per ticker. the path is absolute (next to this module
+# unless MODEL_DIR says otherwise) since it is stored in model_registry and read back by
+# workers running from other directories
+MODEL_DIR = os.path.abspath(os.getenv('MODEL_DIR')
+                            or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts'))
+
+
+def write_artifact(model, ticker, family, horizon):
+    """
+    serializes a fitted model under MODEL_DIR and returns its path. the file name is
+    unique per call, so concurrent trainers never overwrite each other.
+    """
+    directory = os.path.join(MODEL_DIR, ticker)
+    os.makedirs(directory, exist_ok=True)
+    stamp = dt.datetime.now(dt.timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    path = os.path.join(directory, f"{family}_h{horizon}_{stamp}_{os.getpid()}.joblib")
+    tmp_path = f"{path}.tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_artifact(path):
+    # models registered before paths were stored absolute are relative to the repository root
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    return joblib.load(path)
+
+
+def register_model(cursor, ticker, family, horizon, artifact_path, trained_through, input_columns, metrics,
+                   activate=False):
+    """
+    records a model artifact as the next version for (ticker, family, horizon).
+    activate makes it the model used for (ticker, horizon) forecasts, replacing the previous one.
+    returns the new model_id.
+    """
+    if activate:
+        cursor.execute("""
+            UPDATE model_registry SET is_active = FALSE
+            WHERE ticker = %s AND horizon = %s AND is_active;
+        """, (ticker, horizon))
+    cursor.execute("""
+        INSERT INTO model_registry (ticker, family, horizon, version, artifact_path, trained_through,
+                                    input_columns, metrics, is_active)
+        SELECT %(ticker)s, %(family)s, %(horizon)s, COALESCE(MAX(version), 0) + 1, %(artifact_path)s,
+               %(trained_through)s, %(input_columns)s, %(metrics)s, %(activate)s
+        FROM model_registry
+        WHERE ticker = %(ticker)s AND family = %(family)s AND horizon = %(horizon)s
+        RETURNING model_id;
+    """, {'ticker': ticker, 'family': family, 'horizon': horizon, 'artifact_path': artifact_path,
+          'trained_through': trained_through, 'input_columns': list(input_columns),
+          'metrics': json.dumps(metrics), 'activate': activate})
+    return cursor.fetchone()[0]
+
+
+def active_models(cursor, tickers=None):
+    """
+    the active model per (ticker, horizon): model_id, family, version, artifact path and input columns
+    """
+    query = """
+        SELECT ticker, horizon, model_id, family, version, artifact_path, input_columns
+        FROM model_registry WHERE is_active
+    """
+    if tickers:
+        query += " AND ticker = ANY(%(tickers)s)"
+    cursor.execute(query + " ORDER BY ticker, horizon;", {'tickers': list(tickers or [])})
+    columns = [column.name for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -0,0 +1,268 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+# make the repo root importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import connection
+from models.features import fetch_features
+from models.registry import register_model, write_artifact
+
+# model families trained per ticker; each entry builds a fresh, unfitted model
+MODEL_FAMILIES = {
+    'linear': lambda: LinearRegression(),
+    'ridge': lambda: Ridge(alpha=1.0),
+    'forest': lambda: RandomForestRegressor(n_estimators=100, max_depth=5, min_samples_leaf=20, n_jobs=1,
+                                            random_state=42),
+}
+
+# forward log-return horizons (trading days) the models predict
+HORIZONS = (1, 5, 20)
+
+# scale-free inputs derived from the features table
+INPUT_COLUMNS = (
+    'ret_1', 'ret_5', 'ret_20', 'ret_lag_1', 'ret_lag_2', 'ret_lag_5',
+    'close_sma_10', 'close_sma_20', 'close_sma_50', 'ema_12_26', 'macd_norm', 'macd_hist_norm',
+    'rsi_14', 'volatility_20',
+)
+
+# walk-forward validation: expanding training window, N_SPLITS test blocks at the end
+N_SPLITS = 5
+MIN_TRAIN_ROWS = 250
+
+
+def design_inputs(features):
+    """
+    model inputs for feature rows; each row only depends on its own features.
+    price-level indicators are expressed relative to the close so models transfer across tickers.
+    """
+    close = features['close_price']
+    return pd.DataFrame({
+        'ret_1': features['ret_1'], 'ret_5': features['ret_5'], 'ret_20': features['ret_20'],
+        'ret_lag_1': features['ret_lag_1'], 'ret_lag_2': features['ret_lag_2'], 'ret_lag_5': features['ret_lag_5'],
+        'close_sma_10': close / features['sma_10'] - 1,
+        'close_sma_20': close / features['sma_20'] - 1,
+        'close_sma_50': close / features['sma_50'] - 1,
+        'ema_12_26': features['ema_12'] / features['ema_26'] - 1,
+        'macd_norm': features['macd'] / close,
+        'macd_hist_norm': features['macd_hist'] / close,
+        'rsi_14': features['rsi_14'] / 100,
+        'volatility_20': features['volatility_20'],
+    }, columns=INPUT_COLUMNS)
+
+
+def design_matrix(features):
+    """
+    model inputs and forward-return targets for one ticker's features (oldest first)
+    """
+    inputs = design_inputs(features)
+
+    # forward return over h bars: the sum of the next h daily log returns
+    cumulative = features['ret_1'].fillna(0).cumsum()
+    targets = pd.DataFrame({f'target_{h}': cumulative.shift(-h) - cumulative for h in HORIZONS})
+    return inputs, targets
+
+
+def walk_forward_splits(n_rows, n_splits=N_SPLITS, gap=1, min_train=MIN_TRAIN_ROWS):
+    """
+    (train_end, test_start, test_end) row bounds for expanding-window validation. the
+    last rows are cut into n_splits consecutive test blocks; each model trains on every
+    row before its block minus a gap, so overlapping forward-return targets never leak.
+    """
+    test_size = (n_rows - min_train) // n_splits
+    if test_size < 1:
+        return []
+    first_test = n_rows - n_splits * test_size
+    return [(first_test + i * test_size - gap, first_test + i * test_size, first_test + (i + 1) * test_size)
+            for i in range(n_splits)]
+
+
+def pack_shared(blocks):
+    """
+    copies every ticker's (inputs | targets) matrix into one shared memory block.
+    returns the block and, per ticker, the row range of its slice.
+    """
+    n_rows = sum(len(block) for block in blocks.values())
+    n_columns = len(INPUT_COLUMNS) + len(HORIZONS)
+    shm = shared_memory.SharedMemory(create=True, size=max(n_rows * n_columns * 8, 1))
+    matrix = np.ndarray((n_rows, n_columns), dtype=np.float64, buffer=shm.buf)
+    offsets, row = {}, 0
+    for ticker, block in blocks.items():
+        matrix[row:row + len(block)] = block
+        offsets[ticker] = (row, row + len(block))
+        row += len(block)
+    return shm, (n_rows, n_columns), offsets
+
+
+# set in each worker process by attach_shared
+_shared = {}
+
+
+def attach_shared(name, shape):
+    """
+    process pool initializer: maps the shared feature matrix into the worker without copying
+    """
+    # pool workers share the parent's resource tracker, which unlinks the block if the parent dies
+    shm = shared_memory.SharedMemory(name=name)
+    _shared['shm'] = shm
+    _shared['matrix'] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def evaluate(y_true, y_pred):
+    return {
+        'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        'mae': float(mean_absolute_error(y_true, y_pred)),
+        'r2': float(r2_score(y_true, y_pred)),
+        'hit_rate': float(np.mean(np.sign(y_true) == np.sign(y_pred))),
+    }
+
+
+def train_ticker(ticker, start, stop, families, n_splits, save=False):
+    """
+    walk-forward validates every model family on every horizon for one ticker. the
+    inputs are a view of the shared matrix, reused by every family and horizon.
+    save refits each model on every row and writes it as an artifact.
+    returns one result row per (family, horizon).
+    """
+    block = _shared['matrix'][start:stop]
+    inputs = block[:, :len(INPUT_COLUMNS)]
+    results = []
+    for h_index, horizon in enumerate(HORIZONS):
+        target = block[:, len(INPUT_COLUMNS) + h_index]
+        # the last rows have no forward return yet
+        n_rows = int(np.searchsorted(np.isnan(target), True))
+        splits = walk_forward_splits(n_rows, n_splits, gap=horizon)
+        if not splits:
+            continue
+        for family in families:
+            predictions, actuals, fit_time = [], [], 0.0
+            for train_end, test_start, test_end in splits:
+                model = MODEL_FAMILIES[family]()
+                fit_start = time.perf_counter()
+                model.fit(inputs[:train_end], target[:train_end])
+                fit_time += time.perf_counter() - fit_start
+                predictions.append(model.predict(inputs[test_start:test_end]))
+                actuals.append(target[test_start:test_end])
+            result = {'ticker': ticker, 'model': family, 'horizon': horizon, 'rows': n_rows,
+                      'fit_seconds': fit_time, **evaluate(np.concatenate(actuals), np.concatenate(predictions))}
+            if save:
+                model = MODEL_FAMILIES[family]()
+                model.fit(inputs[:n_rows], target[:n_rows])
+                result['artifact_path'] = write_artifact(model, ticker, family, horizon)
+            results.append(result)
+    return results
+
+
+def load_design(tickers=None):
+    """
+    design matrices (inputs then targets, rows without complete inputs dropped) per
+    ticker, and the dates of their rows
+    """
+    with connection() as conn:
+        if not tickers:
+            tickers = pd.read_sql("SELECT ticker FROM public.feature_state ORDER BY ticker;", conn)['ticker'].tolist()
+        features = fetch_features(conn, tickers)
+
+    blocks, dates = {}, {}
+    for ticker, ticker_features in features.groupby('ticker'):
+        inputs, targets = design_matrix(ticker_features.reset_index(drop=True))
+        complete = inputs.notna().all(axis=1).to_numpy()
+        blocks[ticker] = np.hstack([inputs.to_numpy()[complete], targets.to_numpy()[complete]])
+        dates[ticker] = ticker_features['date'].to_numpy()[complete]
+    return blocks, dates
+
+
+def register_results(results, dates):
+    """
+    records every saved model in the registry and activates, per (ticker, horizon),
+    the family with the lowest walk-forward RMSE
+    """
+    best = results.loc[results.groupby(['ticker', 'horizon'])['rmse'].idxmin()].index
+    metric_columns = ['rows', 'fit_seconds', 'rmse', 'mae', 'r2', 'hit_rate']
+    with connection() as conn, conn.cursor() as cursor:
+        for index, result in results.iterrows():
+            register_model(cursor, result['ticker'], result['model'], int(result['horizon']), result['artifact_path'],
+                           dates[result['ticker']][int(result['rows']) - 1], INPUT_COLUMNS,
+                           {column: float(result[column]) for column in metric_columns},
+                           activate=index in best)
+    print(f"🗃️ {len(results)} models registered, {len(best)} activated.")
+
+
+def train(tickers=None, families=tuple(MODEL_FAMILIES), n_splits=N_SPLITS, max_workers=None, register=False):
+    """
+    trains and validates the model families for every ticker on a process pool sharing
+    one copy of the feature matrices. register also fits every model on the full history
+    and records it in the model registry. returns a frame with one row per (ticker, model, horizon).
+    """
+    unknown = set(families) - set(MODEL_FAMILIES)
+    if unknown:
+        raise ValueError(f"Invalid model families {sorted(unknown)} specified. Use any of {tuple(MODEL_FAMILIES)}.")
+
+    blocks, dates = load_design(tickers)
+    shm, shape, offsets = pack_shared(blocks)
+    del blocks
+    max_workers = max_workers or os.cpu_count()
+    results = []
+    start = time.perf_counter()
+    try:
+        print(f"----- training {len(families)} model families for {len(offsets)} tickers "
+              f"with {max_workers} processes ... -----")
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=attach_shared,
+                                 initargs=(shm.name, shape)) as executor:
+            futures = {executor.submit(train_ticker, ticker, row_start, row_stop, families, n_splits, register): ticker
+                       for ticker, (row_start, row_stop) in offsets.items()}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    ticker_results = future.result()
+                except Exception as e:
+                    print(f"❌ failed to train {ticker}: {e}")
+                    continue
+                results.extend(ticker_results)
+                fit_time = sum(result['fit_seconds'] for result in ticker_results)
+                print(f"🤖 {ticker}: {len(ticker_results)} models validated, {fit_time:.2f}s fitting.")
+    finally:
+        shm.close()
+        shm.unlink()
+
+    print(f"----- trained {len(offsets)} tickers in {time.perf_counter() - start:.1f}s -----")
+    results = pd.DataFrame(results)
+    if register and not results.empty:
+        register_results(results, dates)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="walk-forward training of the model families for every ticker")
+    parser.add_argument('tickers', nargs='*', help="tickers to train (default: every ticker with features)")
+    parser.add_argument('--models', default=','.join(MODEL_FAMILIES),
+                        help=f"comma separated model families (default: {','.join(MODEL_FAMILIES)})")
+    parser.add_argument('--splits', type=int, default=N_SPLITS, help="walk-forward test blocks per ticker")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: every core)")
+    parser.add_argument('--output', help="write the per-ticker results to this CSV file")
+    parser.add_argument('--register', action='store_true',
+                        help="refit on the full history and register the models (the best family per horizon is activated)")
+    args = parser.parse_args()
+
+    results = train(args.tickers, tuple(args.models.split(',')), args.splits, args.workers, args.register)
+    if results.empty:
+        print("no ticker had enough history to train on.")
+        return
+    summary = results.groupby(['model', 'horizon'])[['rmse', 'mae', 'r2', 'hit_rate', 'fit_seconds']].mean()
+    print(summary.to_string(float_format=lambda value: f"{value:.4f}"))
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"📝 results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# trailing trading days the correlation heatmap can be computed over
+CORRELATION_WINDOWS = {'1m': 21, '3m': 63, '6m': 126, '1y': 252}
+
+# bins of the returns distribution, shared by every ticker
+RETURN_BINS = 60
+
+
+def normalized(closes):
+    """
+    each ticker's closes rebased to 100 at its first close in the frame
+    """
+    values = closes.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    first = values[valid.argmax(axis=0), np.arange(values.shape[1])]
+    return pd.DataFrame(values / first * 100, index=closes.index, columns=closes.columns)
+
+
+def daily_returns(closes):
+    """
+    simple daily returns as a (date x ticker) array; NaN where either close is missing
+    """
+    values = closes.to_numpy(dtype=float)
+    returns = np.full_like(values, np.nan)
+    returns[1:] = values[1:] / values[:-1] - 1
+    return returns
+
+
+def pairwise_correlation(returns):
+    """
+    correlation matrix of the (date x ticker) returns, each pair over the dates both have a
+    return (pairwise-complete, like DataFrame.corr) but computed with a handful of matrix products
+    """
+    present = (~np.isnan(returns)).astype(float)
+    values = np.nan_to_num(returns)
+    # per pair: number of shared dates, sums and sums of squares of each side over those dates
+    n = present.T @ present
+    sums = values.T @ present
+    squares = (values * values).T @ present
+    products = values.T @ values
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = products / n - (sums / n) * (sums.T / n)
+        variance = squares / n - (sums / n) ** 2
+        correlation = covariance / np.sqrt(variance * variance.T)
+    correlation[n < 3] = np.nan
+    return np.clip(correlation, -1, 1)
+
+
+def returns_histogram(returns):
+    """
+    distribution of each ticker's daily returns over shared bins (clipped to the pooled
+    1st-99th percentile so outliers don't flatten the plot); returns bin centers and
+    a (bin x ticker) array of the share of each ticker's days in the bin
+    """
+    pooled = returns[~np.isnan(returns)]
+    if pooled.size == 0:
+        return np.array([]), np.empty((0, returns.shape[1]))
+    low, high = np.percentile(pooled, [1, 99])
+    edges = np.linspace(low, high, RETURN_BINS + 1)
+    bins = np.clip(np.searchsorted(edges, returns, side='right') - 1, 0, RETURN_BINS - 1)
+    counts = np.zeros((RETURN_BINS, returns.shape[1]))
+    columns = np.broadcast_to(np.arange(returns.shape[1]), returns.shape)
+    valid = ~np.isnan(returns)
+    np.add.at(counts, (bins[valid], columns[valid]), 1)
+    return (edges[:-1] + edges[1:]) / 2, counts / np.maximum(valid.sum(axis=0), 1)
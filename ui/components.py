@@ -1,26 +1,79 @@
+import os
 import streamlit as st
 import plotly.express as px
 import pandas as pd
+from ui.comparison import CORRELATION_WINDOWS, daily_returns, normalized, pairwise_correlation, returns_histogram
+from ui.downsample import downsample
+from data.thumbnails import THUMBNAIL_WIDTH, cached_thumbnail
+from data import metrics
 
+# widest the chart is drawn, in pixels, and pixels per plotted point; together they
+# cap how many points are sent to the browser whatever the time frame. the chart
+# fills the page's wide layout, but Streamlit doesn't report the browser's width
+# to the server, so set CHART_WIDTH_PX to the widest screen the app is viewed on
+CHART_WIDTH_PX = int(os.getenv('CHART_WIDTH_PX', 1200))
+PX_PER_POINT = 2
+
+# bar resolution read for each time frame: intraday bars for the short frames (falling back
+# to daily bars until enough intraday history exists), daily up to a year, then weekly/monthly rollups
+TIME_FRAME_RESOLUTIONS = {
+    '1w': '15m',
+    '1m': '1h',
+    '5y': 'W',
+    'max': 'M',
+}
+
+# indicator lines that can be overlaid on the chart, read from the features table
+INDICATORS = {
+    'sma_20': 'SMA 20',
+    'sma_50': 'SMA 50',
+    'ema_12': 'EMA 12',
+    'ema_26': 'EMA 26',
+}
+
+
+@metrics.timed('ui_component_seconds', component='news_list')
 def stock_news_list(stock_news):
     """
-    display a list of stock news articles
+    display a list of stock news articles, with thumbnails from the local cache
     """
-    for i in range(min(25, len(stock_news))):
+    for article in stock_news.itertuples():
         col1, col2 = st.columns([2, 1])
         with col1:
-            article = stock_news.iloc[i]
-            publish_time = pd.to_datetime(article['provider_publish_time'])
-            formatted_time = publish_time.strftime('%b %d, %Y')
-            st.markdown(f"### [{article['title']}]({article['link']})")
-            st.markdown(f"{formatted_time}")
-            st.markdown(f"{article['type'].lower()} by *{article['publisher']}*")
+            formatted_time = pd.to_datetime(article.provider_publish_time).strftime('%b %d, %Y')
+            st.markdown(f"### [{article.title}]({article.link})\n\n{formatted_time}\n\n"
+                        f"{article.type.lower()} by *{article.publisher}*")
         with col2:
-            if article['thumbnail_url']:
-                st.markdown(f'<img src="{article["thumbnail_url"]}" alt="{article["title"]}" style="width:300px;">', unsafe_allow_html=True)
+            thumbnail = cached_thumbnail(article.uuid)
+            if thumbnail:
+                st.image(thumbnail, width=THUMBNAIL_WIDTH)
         st.write("---")
 
-def stock_header_with_info(stock_metadata, stock_data):
+
+@st.fragment(run_every=2)
+def refresh_progress(refresh_queue):
+    """
+    polls the background refresh queue and shows its progress; reruns the page
+    once the ticker the user asked to refresh has finished
+    """
+    progress = refresh_queue.progress()
+    counts = progress['counts']
+    finished = counts['done'] + counts['failed']
+    total = finished + counts['queued'] + counts['running']
+    if progress['active']:
+        st.progress(finished / max(total, 1), text=f"refreshing data: {finished}/{total} tickers")
+    else:
+        st.write("data refreshed successfully." if not counts['failed']
+                 else f"data refreshed; {counts['failed']} tickers failed.")
+
+    awaiting = st.session_state.get('awaiting_refresh')
+    if awaiting and progress['status'].get(awaiting) in ('done', 'failed'):
+        del st.session_state['awaiting_refresh']
+        st.rerun()
+
+
+@metrics.timed('ui_component_seconds', component='header')
+def stock_header_with_info(stock_metadata, stock_stats):
     """
     UI component to display basic stock information (name and current price)
     """
@@ -33,10 +86,10 @@ def stock_header_with_info(stock_metadata, stock_data):
         st.markdown(f"<p style='font-size: 18px;'>{long_name}</p>", unsafe_allow_html=True)
     with col2:
         st.write("")
-        display_info_tabs(stock_metadata, stock_data)
+        display_info_tabs(stock_metadata, stock_stats)
 
         
-def display_info_tabs(stock_metadata, stock_data):
+def display_info_tabs(stock_metadata, stock_stats):
     """
     tabs to display general stock information, daily stats, and 52-week stats
     """
@@ -46,7 +99,7 @@ def display_info_tabs(stock_metadata, stock_data):
     with tabs[1]:
         display_daily_stats(stock_metadata)
     with tabs[2]:
-        display_52_week_stats(stock_data)
+        display_52_week_stats(stock_stats)
 
 
 def display_general_info(stock_metadata):
@@ -110,13 +163,12 @@ def display_daily_stats(stock_metadata):
     with subcol5:
         pass
 
-def display_52_week_stats(stock_data):
+def display_52_week_stats(stock_stats):
     """
-    display 52-week high and 52-week low
+    display 52-week high and 52-week low (closing prices, precomputed at ingest)
     """
-    year_data = filter_stock_data(stock_data, '365 days')
-    high_52_week = year_data['close_price'].max()
-    low_52_week = year_data['close_price'].min()
+    high_52_week = stat_value(stock_stats, 'high_52_week')
+    low_52_week = stat_value(stock_stats, 'low_52_week')
     subcol1, subcol2, subcol3 = st.columns([1, 1, 4])
     with subcol1:
         if high_52_week:
@@ -128,9 +180,13 @@ def display_52_week_stats(stock_data):
             st.markdown(f'<span style="font-size:18px;">`${low_52_week:,.2f}`</span>', unsafe_allow_html=True)
 
 
-def stock_chart(stock_data, stock_metadata):
+@metrics.timed('ui_component_seconds', component='chart')
+def stock_chart(load_stock_data, stock_metadata, stock_stats, load_indicators=None, forecast=None):
     """
-    display stock chart and price difference information
+    display stock chart and price difference information.
+    load_stock_data(start_date, resolution) returns the bars for the selected time frame, newest first.
+    load_indicators(start_date, columns) returns the selected indicator columns from the features table.
+    forecast holds the precomputed predictions drawn past the last bar.
     """
     col1, col2 = st.columns([3, 1])
     
@@ -142,66 +198,114 @@ def stock_chart(stock_data, stock_metadata):
         st.write("")
         st.write("")
         time_frame = select_time_frame()
-        filtered_data = filter_stock_data(stock_data, time_frame)
+        start_date = time_frame_start(to_time_period(time_frame))
+        filtered_data = load_stock_data(start_date, TIME_FRAME_RESOLUTIONS.get(time_frame, 'D'))
+        selected = select_indicators() if load_indicators else []
+        indicators = load_indicators(start_date, tuple(selected)) if selected else None
 
     with col2:
-        display_price_info(filtered_data, stock_metadata)
+        display_price_info(stock_stats, time_frame, stock_metadata)
     
-    plot_stock_chart(filtered_data)
+    plot_stock_chart(filtered_data, indicators=indicators, forecast=forecast)
 
 
 def select_time_frame():
     """
     UI component for selecting the time frame of the stock chart
     """
-    time_frame = st.radio('Time frame:', ['1w', '1m', '6m', '1y', '5y', 'max'], index=1, horizontal=True)
-    return to_time_period(time_frame)
+    return st.radio('Time frame:', ['1w', '1m', '6m', '1y', '5y', 'max'], index=1, horizontal=True)
+
+
+def select_indicators():
+    """
+    UI component for picking the indicator lines overlaid on the stock chart
+    """
+    return st.multiselect('Indicators:', list(INDICATORS), format_func=INDICATORS.get)
 
 
-def filter_stock_data(stock_data, time_frame):
+def time_frame_start(time_frame):
     """
-    filter the stock data based on the selected time period
+    first date shown for the selected time period
     """
     time_delta = pd.Timedelta(time_frame)
-    start_date = pd.Timestamp.now().date() - time_delta
-    return stock_data[stock_data['date'] >= start_date].sort_values('date', ascending=False)
+    return pd.Timestamp.now().date() - time_delta
+
+
+def stat_value(stock_stats, column):
+    """
+    one value of the ticker's stock_stats row, or None when there is no row yet or it is NULL
+    """
+    if stock_stats.empty or pd.isna(stock_stats[column].iloc[0]):
+        return None
+    return float(stock_stats[column].iloc[0])
 
 
-def display_price_info(filtered_data, stock_metadata):
+def display_price_info(stock_stats, time_frame, stock_metadata):
     """
     display the current price, price difference, and percentage change
+    since the first open of the time frame (precomputed in stock_stats)
     """
-    start_price = filtered_data['open_price'].iloc[-1]
     current_price = stock_metadata['regular_market_price'][0]
-    price_diff = current_price - start_price
-    price_diff_percent = (price_diff / start_price) * 100
+    start_price = stat_value(stock_stats, f'start_price_{time_frame}')
+    last_close = stat_value(stock_stats, 'last_close')
+    price_diff_percent = stat_value(stock_stats, f'change_{time_frame}')
 
     st.markdown(f"<h1 style='font-size: 48px;'>${current_price:,.2f}</h1>", unsafe_allow_html=True)
 
-    sign = "+" if price_diff > 0 else "-"
-    price_diff_text = f"{sign}${abs(price_diff):,.2f} ({sign}{abs(price_diff_percent):,.2f}%)"
-    color = "green" if price_diff > 0 else "red"
-    
-    st.markdown(f"<p style='font-size: 18px; color: {color};'>{price_diff_text}</p>", unsafe_allow_html=True)
+    if start_price is None or last_close is None or price_diff_percent is None:
+        st.markdown("<p style='font-size: 18px; color: gray;'>n/a</p>", unsafe_allow_html=True)
+    else:
+        price_diff = last_close - start_price
+        sign = "+" if price_diff > 0 else "-"
+        price_diff_text = f"{sign}${abs(price_diff):,.2f} ({sign}{abs(price_diff_percent):,.2f}%)"
+        color = "green" if price_diff > 0 else "red"
+        st.markdown(f"<p style='font-size: 18px; color: {color};'>{price_diff_text}</p>", unsafe_allow_html=True)
 
     last_updated = pd.to_datetime(stock_metadata['last_updated'][0])
     st.markdown(f"as of {last_updated.strftime('%b %d, %Y %I:%M%p')}")
 
 
-def plot_stock_chart(filtered_data):
+def plot_stock_chart(filtered_data, max_points=CHART_WIDTH_PX // PX_PER_POINT, indicators=None, forecast=None):
+    """
+    plot the stock chart using Plotly (see build_stock_chart)
+    """
+    with metrics.timer('ui_component_seconds', component='chart_build'):
+        fig = build_stock_chart(filtered_data, max_points, indicators, forecast)
+    with metrics.timer('ui_component_seconds', component='chart_render'):
+        st.plotly_chart(fig)
+
+
+def build_stock_chart(filtered_data, max_points=CHART_WIDTH_PX // PX_PER_POINT, indicators=None, forecast=None):
     """
-    plot the stock chart using Plotly
+    the stock chart figure, downsampled to at most max_points points, with any indicator
+    columns of the indicators frame drawn as thin lines on top and the forecast
+    (predicted price per horizon) as a dashed line from the last bar
     """
-    fig = px.line(filtered_data, x="date", y="close_price")
+    fig = px.line(downsample(filtered_data, max_points), x="date", y="close_price")
     fig.update_traces(line=dict(width=6))
+    if indicators is not None:
+        for column in indicators.columns.drop(['ticker', 'date']):
+            points = downsample(indicators.dropna(subset=[column]), max_points, y=column)
+            fig.add_scatter(x=points['date'], y=points[column], mode='lines', name=INDICATORS.get(column, column),
+                            line=dict(width=2))
+    intraday = pd.api.types.is_datetime64_any_dtype(filtered_data['date'])
+    if forecast is not None and not forecast.empty and not filtered_data.empty:
+        last = filtered_data.loc[filtered_data['date'].idxmax()]
+        dates = pd.to_datetime(forecast['target_date']) if intraday else forecast['target_date']
+        fig.add_scatter(x=[last['date'], *dates], y=[last['close_price'], *forecast['predicted_price']],
+                        mode='lines+markers', name='forecast', line=dict(width=3, dash='dash'),
+                        hovertemplate='%{x}<br>forecast: $%{y:,.2f}<extra></extra>')
     fig.update_layout(
         xaxis_title="Date",
         yaxis_title="Close Price",
-        xaxis_tickformat='%b %d, %Y',
+        xaxis_tickformat='%b %d %H:%M' if intraday else '%b %d, %Y',
         xaxis_showgrid=False,
         hoverlabel=dict(font_size=18, bordercolor="white"),
     )
-    st.plotly_chart(fig)
+    if intraday:
+        # hide weekends and the overnight gap between sessions
+        fig.update_xaxes(rangebreaks=[dict(bounds=['sat', 'mon']), dict(bounds=[16, 9.5], pattern='hour')])
+    return fig
 
 
 def to_time_period(time_frame):
@@ -218,3 +322,55 @@ def to_time_period(time_frame):
     }
     return periods.get(time_frame, '365 days')
 
+
+@metrics.timed('ui_component_seconds', component='comparison')
+def comparison_view(load_close_matrix):
+    """
+    compares several tickers: performance rebased to 100, the correlation of their daily
+    returns over a trailing window, and the distribution of their daily returns.
+    load_close_matrix(start_date) returns the (date x ticker) daily closes, dates ascending.
+    """
+    time_frame = select_time_frame()
+    closes = load_close_matrix(time_frame_start(to_time_period(time_frame)))
+    if closes.empty:
+        st.write("no price data for the selected tickers.")
+        return
+
+    performance = normalized(closes)
+    fig = px.line(performance, labels={'index': 'Date', 'value': 'Performance (start = 100)', 'variable': 'Ticker'})
+    fig.update_layout(xaxis_showgrid=False, hoverlabel=dict(font_size=18, bordercolor="white"))
+    st.plotly_chart(fig)
+
+    returns = daily_returns(closes)
+    col1, col2 = st.columns(2)
+    with col1:
+        window = st.radio('Correlation window:', list(CORRELATION_WINDOWS), index=1, horizontal=True)
+        correlation = pairwise_correlation(returns[-CORRELATION_WINDOWS[window]:])
+        fig = px.imshow(correlation, x=list(closes.columns), y=list(closes.columns), zmin=-1, zmax=1,
+                        color_continuous_scale='RdBu', text_auto='.2f')
+        st.plotly_chart(fig)
+    with col2:
+        st.write("daily returns distribution")
+        centers, shares = returns_histogram(returns)
+        fig = px.line(pd.DataFrame(shares, index=centers, columns=closes.columns), line_shape='hvh',
+                      labels={'index': 'Daily return', 'value': 'Share of days', 'variable': 'Ticker'})
+        fig.update_layout(xaxis_tickformat='.1%', yaxis_tickformat='.0%')
+        st.plotly_chart(fig)
+
+
+def metrics_debug_panel(events):
+    """
+    debug panel summing the timings and counters recorded during this rerun
+    """
+    with st.expander('⏱️ timings (this rerun)'):
+        if not events:
+            st.write("no timings recorded.")
+            return
+        rows = pd.DataFrame([{
+            'metric': event['name'],
+            'labels': ', '.join(str(value) for key, value in event.items() if key not in ('type', 'name', 'seconds', 'value')),
+            'calls': 1,
+            'ms': event['seconds'] * 1000 if event['type'] == 'timer' else None,
+            'count': event.get('value'),
+        } for event in events])
+        st.dataframe(rows.groupby(['metric', 'labels'], as_index=False).sum(min_count=1), hide_index=True)
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: indices of n_out points of (x, y) that keep
+    the visual shape of the series. x must be ascending; first and last points are kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # the points between the first and last are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    selected = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # average of the next bucket (or the last point) is the third triangle vertex
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # pick the point forming the largest triangle with the previous pick and the next average
+        areas = np.abs((x[selected] - avg_x) * (y[start:end] - y[selected])
+                       - (x[selected] - x[start:end]) * (avg_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[i + 1] = selected
+
+    return indices
+
+
+def downsample(stock_data, n_out, y='close_price', x='date'):
+    """
+    reduce stock_data to at most n_out rows with LTTB on column y, sorted by x ascending
+    """
+    stock_data = stock_data.sort_values(x)
+    if len(stock_data) <= n_out:
+        return stock_data
+    x_values = pd.to_datetime(stock_data[x]).to_numpy(dtype='datetime64[s]').astype(np.float64)
+    y_values = stock_data[y].to_numpy(dtype=np.float64)
+    return stock_data.iloc[lttb_indices(x_values, y_values, n_out)]